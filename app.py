@@ -2,28 +2,1900 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 import time
 import os
-import openpyxl
+import io
+import hashlib
+import tempfile
 from datetime import datetime
-import altair as alt
 import math
+import random
+import json
+import threading
+import functools
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from supabase import create_client
+
+# --- Diagnostics ---
+DIAGNOSTICS_EVENT_LIMIT = 5000
+DIAGNOSTICS_LOG_PATH = os.environ.get("DIAGNOSTICS_LOG_PATH")
+DIAGNOSTICS_QUERY_OPERATIONS = {"select", "insert", "upsert", "update", "delete"}
+RETRIED_OPERATIONS = {"select", "rpc"}
+
+class Diagnostics:
+    """Process-wide record of timed Supabase calls, cached loaders and page renders:
+    a bounded event log plus running totals per (kind, name). The page trace context
+    lives here rather than at module level, because objects cached across reruns (the
+    Supabase client) keep the globals of the run that created them."""
+
+    def __init__(self):
+        self.events = deque(maxlen=DIAGNOSTICS_EVENT_LIMIT)
+        self.totals = {}
+        self.lock = threading.Lock()
+        self.active_trace = contextvars.ContextVar("active_trace", default=None)
+        self.cache_calls = threading.local()
+
+    def record(self, event):
+        with self.lock:
+            self.events.append(event)
+            totals = self.totals.setdefault((event["kind"], event["name"]), {
+                "calls": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0, "rows": 0, "bytes": 0,
+                "cache_hits": 0, "cache_misses": 0, "dataframe_bytes": 0})
+            totals["calls"] += 1
+            totals["errors"] += event["error"] is not None
+            totals["seconds"] += event["seconds"]
+            totals["max_seconds"] = max(totals["max_seconds"], event["seconds"])
+            totals["rows"] += event["rows"]
+            totals["bytes"] += event["bytes"]
+            totals["cache_hits"] += event["cache"] == "hit"
+            totals["cache_misses"] += event["cache"] == "miss"
+            if event["dataframe_bytes"]:
+                totals["dataframe_bytes"] = event["dataframe_bytes"]
+
+    def reset(self):
+        with self.lock:
+            self.events.clear()
+            self.totals.clear()
+
+    def to_json_lines(self):
+        with self.lock:
+            events = list(self.events)
+        return "".join(json.dumps({key: value for key, value in event.items() if key != "started"}) + "\n" for event in events)
+
+    def to_prometheus(self):
+        with self.lock:
+            totals = {key: dict(value) for key, value in self.totals.items()}
+        metrics = [
+            ("calls", "calls_total", "counter", "Completed calls."),
+            ("errors", "errors_total", "counter", "Calls that raised."),
+            ("seconds", "duration_seconds_total", "counter", "Total wall time in seconds."),
+            ("max_seconds", "duration_seconds_max", "gauge", "Slowest call in seconds."),
+            ("rows", "rows_total", "counter", "Rows returned."),
+            ("bytes", "response_bytes_total", "counter", "JSON bytes received from Supabase, measured while diagnostics are shown or logged."),
+            ("cache_hits", "cache_hits_total", "counter", "Cached loader hits."),
+            ("cache_misses", "cache_misses_total", "counter", "Cached loader misses."),
+            ("dataframe_bytes", "dataframe_bytes", "gauge", "Memory of the last computed result.")]
+        lines = []
+        for field, metric, metric_type, help_text in metrics:
+            lines += [f"# HELP dispatch_app_{metric} {help_text}", f"# TYPE dispatch_app_{metric} {metric_type}"]
+            for (kind, name), values in sorted(totals.items()):
+                label = name.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'dispatch_app_{metric}{{kind="{kind}",name="{label}"}} {values[field]}')
+        return "\n".join(lines) + "\n"
+
+    def append_log(self, events):
+        if DIAGNOSTICS_LOG_PATH:
+            with self.lock, open(DIAGNOSTICS_LOG_PATH, "a") as log_file:
+                log_file.writelines(
+                    json.dumps({key: value for key, value in event.items() if key != "started"}) + "\n" for event in events)
+
+@st.cache_resource
+def get_diagnostics():
+    return Diagnostics()
+
+def result_size(result):
+    # (rows, bytes) of a loader result; DataFrames nested in tuples and dicts are counted.
+    if isinstance(result, pd.DataFrame):
+        return len(result), int(result.memory_usage(deep=True).sum())
+    if isinstance(result, pd.Series):
+        return len(result), int(result.memory_usage(deep=True))
+    if isinstance(result, bytes):
+        return 0, len(result)
+    items = result.values() if isinstance(result, dict) else result if isinstance(result, (tuple, list)) else ()
+    rows, size = 0, 0
+    for item in items:
+        item_rows, item_size = result_size(item)
+        rows, size = rows + item_rows, size + item_size
+    return rows, size
+
+@contextmanager
+def diagnostic_span(kind, name):
+    diagnostics = get_diagnostics()
+    trace = diagnostics.active_trace.get()
+    event = {"ts": time.time(), "kind": kind, "name": name, "page": trace["page"] if trace else None,
+             "seconds": 0.0, "rows": 0, "bytes": 0, "cache": None, "dataframe_bytes": 0, "error": None,
+             "started": time.perf_counter()}
+    try:
+        yield event
+    except Exception as e:
+        event["error"] = type(e).__name__
+        raise
+    finally:
+        event["seconds"] = time.perf_counter() - event["started"]
+        if trace is not None:
+            trace["events"].append(event)
+        diagnostics.record(event)
+
+def submit_with_context(executor, fn, *args):
+    # Worker threads inherit the page trace, so their Supabase calls are attributed to the page.
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+class InstrumentedQuery:
+    """Wraps a postgrest request builder; every execute() is timed and recorded."""
+
+    def __init__(self, builder, target, operation=None):
+        self._builder = builder
+        self._target = target
+        self._operation = operation
+
+    def __getattr__(self, attr):
+        value = getattr(self._builder, attr)
+        if not callable(value):
+            return value
+        def chained(*args, **kwargs):
+            result = value(*args, **kwargs)
+            if not hasattr(result, "execute"):
+                return result
+            return InstrumentedQuery(result, self._target, attr if attr in DIAGNOSTICS_QUERY_OPERATIONS else self._operation)
+        return chained
+
+    def execute(self):
+        with diagnostic_span("query", f"{self._target} {self._operation or 'select'}") as event:
+            # Only reads are retried; a write that timed out may still have been applied.
+            response = call_with_retries(self._builder.execute, retry=(self._operation or "select") in RETRIED_OPERATIONS)
+            data = response.data
+            event["rows"] = len(data) if isinstance(data, list) else int(data is not None)
+            trace = get_diagnostics().active_trace.get()
+            if DIAGNOSTICS_LOG_PATH or (trace is not None and trace["measure_bytes"]):
+                # postgrest's response keeps no raw body, and re-encoding it costs about as much CPU
+                # as decoding did, so the size is only measured while diagnostics are shown or logged.
+                event["bytes"] = len(json.dumps(data, default=str))
+            return response
+
+class InstrumentedClient:
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, table_name):
+        return InstrumentedQuery(self._client.table(table_name), table_name)
+
+    def rpc(self, function_name, *args, **kwargs):
+        return InstrumentedQuery(self._client.rpc(function_name, *args, **kwargs), function_name, "rpc")
+
+    def __getattr__(self, attr):
+        return getattr(self._client, attr)
+
+def instrumented_cache_data(tables=(), serve_stale=False, **cache_options):
+    # st.cache_data that records each call as a hit or a miss, with the result's size on a miss.
+    # With tables, the cache key also carries those tables' current versions, so a result is
+    # reused exactly until one of them changes. With serve_stale, a call that fails with a
+    # transient backend error returns the last good result and reloads it in the background.
+    def decorator(func):
+        @functools.wraps(func)
+        def compute(*args, table_versions=None, **kwargs):
+            get_diagnostics().cache_calls.stack[-1] = True
+            return func(*args, **kwargs)
+        cached_func = st.cache_data(**cache_options)(compute)
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stack = get_diagnostics().cache_calls.__dict__.setdefault("stack", [])
+            stack.append(False)
+            with diagnostic_span("loader", func.__qualname__.replace(".<locals>", "")) as event:
+                stale_key = (func.__qualname__, repr(args), repr(sorted(kwargs.items())))
+                try:
+                    versions = {"table_versions": tuple(table_version(table_name) for table_name in tables)} if tables else {}
+                    result = cached_func(*args, **kwargs, **versions)
+                except Exception as e:
+                    stale = get_stale_results().get(stale_key) if serve_stale and is_transient_error(e) else None
+                    if stale is None:
+                        raise
+                    result, loaded_at = stale
+                    event["cache"] = "stale"
+                    note_stale_data(func.__qualname__, loaded_at)
+                    get_prefetch_scheduler().submit(func.__qualname__, wrapper, *args, **kwargs)
+                    return result
+                finally:
+                    missed = stack.pop()
+                if serve_stale:
+                    get_stale_results().put(stale_key, result, cache_options.get("max_entries"))
+                event["cache"] = "miss" if missed else "hit"
+                if missed:
+                    event["rows"], event["dataframe_bytes"] = result_size(result)
+                return result
+        wrapper.clear = cached_func.clear
+        return wrapper
+    return decorator
+
+@contextmanager
+def trace_page(page_name, measure_bytes=False):
+    diagnostics = get_diagnostics()
+    trace = {"page": page_name, "events": [], "measure_bytes": measure_bytes}
+    token = diagnostics.active_trace.set(trace)
+    try:
+        with diagnostic_span("page", page_name):
+            yield trace
+    finally:
+        diagnostics.active_trace.reset(token)
+        st.session_state.diagnostics_last_trace = trace
+        diagnostics.append_log(trace["events"])
+
+def show_stale_notice(notice, trace):
+    # Filled in after the run, once its loaders have said whether they served stale data.
+    if trace.get("stale"):
+        oldest_loaded_at = min((loaded_at for loaded_at in trace["stale"].values() if loaded_at), default=None)
+        age = f" from {format_age(time.time() - oldest_loaded_at)} ago" if oldest_loaded_at else ""
+        notice.warning(f"Supabase is not responding, so this page shows data{age}. It refreshes in the background once Supabase is back.")
+
+def traced_fragment(func):
+    # st.fragment whose reruns are traced like a page run. A full run is already inside
+    # trace_page; a fragment rerun runs only this function, so it opens its own trace for
+    # the diagnostics panel and shows its own stale-data notice and timing.
+    @st.fragment
+    @functools.wraps(func)
+    def fragment(*args, **kwargs):
+        stale_notice = st.empty()
+        if get_diagnostics().active_trace.get() is not None:
+            return func(*args, **kwargs)
+        show_diagnostics = st.session_state.get("show_diagnostics", False)
+        with trace_page(f"{func.__name__} (fragment)", measure_bytes=show_diagnostics) as fragment_trace:
+            result = func(*args, **kwargs)
+        show_stale_notice(stale_notice, fragment_trace)
+        if show_diagnostics:
+            st.caption("Last run: " + ", ".join(f"{label} {seconds * 1000:,.0f} ms" for label, seconds in trace_breakdown(fragment_trace).items()))
+        return result
+    return fragment
+
+def covered_seconds(events):
+    # Wall time covered by the events' intervals; overlapping parallel calls count once.
+    covered, current_start, current_end = 0.0, None, None
+    for start, end in sorted((event["started"], event["started"] + event["seconds"]) for event in events):
+        if current_end is None or start > current_end:
+            covered += (current_end - current_start) if current_end is not None else 0.0
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    return covered + ((current_end - current_start) if current_end is not None else 0.0)
+
+def trace_breakdown(trace):
+    page_events = [event for event in trace["events"] if event["kind"] == "page"]
+    total = page_events[-1]["seconds"] if page_events else 0.0
+    query = covered_seconds([event for event in trace["events"] if event["kind"] == "query"])
+    loading = covered_seconds([event for event in trace["events"] if event["kind"] in ("query", "loader")])
+    return {"Total": total, "Query": query, "Decode": max(loading - query, 0.0), "Render": max(total - loading, 0.0)}
+
+def render_diagnostics_panel():
+    diagnostics = get_diagnostics()
+    with st.sidebar.expander("Diagnostics", expanded=True):
+        trace = st.session_state.get("diagnostics_last_trace")
+        if trace is not None:
+            st.write(f"**Last run: {trace['page']}**")
+            st.write("  \n".join(f"{label}: {seconds * 1000:,.0f} ms" for label, seconds in trace_breakdown(trace).items()))
+            st.dataframe(pd.DataFrame(
+                [{"Kind": event["kind"], "Name": event["name"], "ms": round(event["seconds"] * 1000, 1), "Rows": event["rows"],
+                  "Bytes": event["bytes"], "Cache": event["cache"] or ""} for event in trace["events"]]), hide_index=True)
+        with diagnostics.lock:
+            totals = [{"Kind": kind, "Name": name, **values} for (kind, name), values in diagnostics.totals.items()]
+        if totals:
+            st.write("**Since start / last reset**")
+            st.dataframe(pd.DataFrame(totals).sort_values("seconds", ascending=False), hide_index=True)
+        st.download_button("Download JSON lines", diagnostics.to_json_lines(), file_name="diagnostics.jsonl", mime="application/json")
+        st.download_button("Download Prometheus snapshot", diagnostics.to_prometheus(), file_name="diagnostics.prom", mime="text/plain")
+        if st.button("Reset diagnostics"):
+            diagnostics.reset()
+
+# --- Resilient backend calls ---
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY_SECONDS = 0.2
+RETRY_MAX_DELAY_SECONDS = 2.0
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_COOLDOWN_SECONDS = 30
+STALE_RESULTS_MAX_ENTRIES = 64
+# Postgres statement timeouts and connection/resource classes, and gateway statuses.
+TRANSIENT_ERROR_CODES = ("57014", "08", "53", "57P", "429", "502", "503", "504")
+
+class BackendUnavailable(ConnectionError):
+    # A ConnectionError, so it is recognised even when raised by a client cached from an
+    # earlier rerun, whose BackendUnavailable is a different class object.
+    pass
+
+def is_transient_error(e):
+    if isinstance(e, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(e, "code", None)
+    if code:
+        return str(code).startswith(TRANSIENT_ERROR_CODES)
+    return type(e).__module__.startswith(("httpx", "httpcore"))
+
+class CircuitBreaker:
+    """Fails backend calls fast once several transient errors arrive in a row, then lets
+    a single trial call through after the cooldown; its success closes the breaker."""
+
+    def __init__(self, threshold=BREAKER_FAILURE_THRESHOLD, cooldown=BREAKER_COOLDOWN_SECONDS):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            remaining = self.cooldown - (time.monotonic() - self.opened_at)
+            if remaining > 0 or self.trial_in_flight:
+                raise BackendUnavailable(f"Supabase is not responding; retrying in {max(remaining, 0):.0f}s.")
+            self.trial_in_flight = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+@st.cache_resource
+def get_circuit_breaker():
+    return CircuitBreaker()
+
+def call_with_retries(call, retry=True):
+    breaker = get_circuit_breaker()
+    attempts = RETRY_ATTEMPTS if retry else 1
+    for attempt in range(attempts):
+        breaker.before_call()
+        try:
+            result = call()
+        except Exception as e:
+            if not is_transient_error(e):
+                # The backend answered, just not with success.
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt == attempts - 1:
+                raise
+            # Full jitter keeps sessions that failed together from retrying in lockstep.
+            time.sleep(random.uniform(0, min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * 2 ** attempt)))
+        else:
+            breaker.record_success()
+            return result
+
+class StaleResults:
+    """The last good result of each stale-servable loader call, kept so that a failed
+    reload can serve it, marked with its age, instead of an empty frame. Each loader keeps
+    at most as many results as its cache does, least recently used first out."""
+
+    def __init__(self):
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def put(self, key, value, max_entries=None):
+        loader_name = key[0]
+        with self.lock:
+            results = self.results.setdefault(loader_name, OrderedDict())
+            results[key] = (value, time.time())
+            results.move_to_end(key)
+            while len(results) > (max_entries or STALE_RESULTS_MAX_ENTRIES):
+                results.popitem(last=False)
+
+    def get(self, key):
+        with self.lock:
+            results = self.results.get(key[0], {})
+            if key in results:
+                results.move_to_end(key)
+            return results.get(key)
+
+@st.cache_resource
+def get_stale_results():
+    return StaleResults()
+
+def note_stale_data(name, loaded_at):
+    # Recorded on the page trace, which main uses to say how old the data on screen is.
+    trace = get_diagnostics().active_trace.get()
+    if trace is not None:
+        trace.setdefault("stale", {})[name] = loaded_at
+
+def format_age(seconds):
+    if seconds < 90:
+        return f"{seconds:.0f} seconds"
+    if seconds < 90 * 60:
+        return f"{seconds / 60:.0f} minutes"
+    return f"{seconds / 3600:.1f} hours"
+
+@st.cache_resource
+def get_supabase_client():
+    # One client, and so one pooled HTTP session, per server process.
+    return InstrumentedClient(create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"]))
 
-from supabase import create_client, Client
 try:
-    SUPABASE_URL = st.secrets["SUPABASE_URL"]
-    SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    supabase = get_supabase_client()
 except KeyError as e:
     st.error(f"Supabase secret not found: {e}. Please ensure you have configured .streamlit/secrets.toml correctly.")
     st.stop()
 
+# --- Paginated table loading ---
+FETCH_PAGE_SIZE = 1000
+FETCH_MAX_WORKERS = 4
+
+def apply_filters(query, filters):
+    for method, column, value in filters:
+        query = getattr(query, method)(column, value)
+    return query
+
+def count_table_rows(table_name, filters=()):
+    response = apply_filters(supabase.table(table_name).select("*", count="exact", head=True), filters).execute()
+    return response.count or 0
+
+def fetch_table_page(table_name, columns, start, end, filters=()):
+    query = apply_filters(supabase.table(table_name).select(columns), filters)
+    response = query.order("id", desc=False).range(start, end).execute()
+    return pd.DataFrame(response.data or [])
+
+def fetch_edge_id(table_name, filters=(), highest=False):
+    response = apply_filters(supabase.table(table_name).select("id"), filters).order("id", desc=highest).limit(1).execute()
+    return response.data[0]["id"] if response.data else None
+
+def fetch_id_slice(table_name, columns, low_id, high_id, filters=(), page_size=FETCH_PAGE_SIZE):
+    # Rows with low_id <= id < high_id (no upper bound when high_id is None), in keyset pages;
+    # a page ending on the slice's last id needs no empty page after it.
+    slice_filters = tuple(filters) + (("gte", "id", low_id),) + ((("lt", "id", high_id),) if high_id is not None else ())
+    pages = []
+    for df_page in iter_table_pages(table_name, columns, slice_filters, page_size):
+        pages.append(df_page)
+        if high_id is not None and int(df_page["id"].iloc[-1]) >= high_id - 1:
+            break
+    return pages
+
+def fetch_table_paginated(table_name, columns="*", order_by=None, filters=(), page_size=FETCH_PAGE_SIZE, max_workers=FETCH_MAX_WORKERS):
+    # The id range is split into one slice per expected page, each read with keyset pages
+    # (id > the last id read) rather than offsets, so rows deleted or inserted while the table
+    # loads cannot shift a page and make it skip or repeat rows. The last slice has no upper
+    # bound, for rows inserted past the highest id.
+    select_columns = columns if columns == "*" or "id" in [col.strip().strip('"') for col in columns.split(",")] else f"id,{columns}"
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        count_future = submit_with_context(executor, count_table_rows, table_name, filters)
+        high_id_future = submit_with_context(executor, fetch_edge_id, table_name, filters, True)
+        low_id = fetch_edge_id(table_name, filters)
+        total_rows, high_id = count_future.result(), high_id_future.result()
+    if total_rows == 0 or low_id is None:
+        return pd.DataFrame()
+    slice_count = max(1, math.ceil(total_rows / page_size))
+    slice_width = max(1, math.ceil((high_id - low_id + 1) / slice_count))
+    slice_bounds = [(low_id + number * slice_width, low_id + (number + 1) * slice_width if number < slice_count - 1 else None)
+                    for number in range(slice_count)]
+    slices = [None] * slice_count
+    # Background prefetches have no page to draw on, and a bar drawn inside a cached loader would be replayed.
+    show_progress = slice_count > 1 and get_script_run_ctx() is not None
+    progress_bar = st.progress(0.0, text=f"Loading {table_name}...") if show_progress else None
+    with ThreadPoolExecutor(max_workers=min(max_workers, slice_count)) as executor:
+        futures = {
+            submit_with_context(executor, fetch_id_slice, table_name, select_columns, slice_low, slice_high, filters, page_size): slice_number
+            for slice_number, (slice_low, slice_high) in enumerate(slice_bounds)}
+        for slices_done, future in enumerate(as_completed(futures), start=1):
+            slices[futures[future]] = future.result()
+            if progress_bar is not None:
+                progress_bar.progress(slices_done / slice_count, text=f"Loading {table_name}... {slices_done}/{slice_count} pages")
+    if progress_bar is not None:
+        progress_bar.empty()
+    pages = [df_page for slice_pages in slices for df_page in slice_pages]
+    if not pages:
+        return pd.DataFrame()
+    df_loaded = pd.concat(pages, ignore_index=True)
+    if select_columns != columns:
+        df_loaded = df_loaded.drop(columns=["id"])
+    if order_by is not None and order_by in df_loaded.columns:
+        df_loaded = df_loaded.sort_values(order_by, kind="stable", ignore_index=True)
+    return df_loaded
+
+# --- Dispatch table schemas ---
+BADGING_COLUMNS = ["Date", "Tech", "Site", "Hours", "Additional", "Base", "Total"]
+BADGING_NUMERIC_COLUMNS = ["Hours", "Additional", "Base", "Total"]
+LIVE_DISPATCHES_COLUMNS = [
+    "Date", "Tech", "SLA", "Site", "Hours",
+    "Rounded Hours", "Additional", "Base", "DXC Rate", "Total FN Pay", "Total DXC Pay", "PNL"]
+LIVE_DISPATCHES_NUMERIC_COLUMNS = ["Hours", "Rounded Hours", "Additional", "Base", "DXC Rate", "Total FN Pay", "Total DXC Pay", "PNL"]
+SYNC_UPDATED_AT_COLUMN = "updated_at"
+SYNC_KEY_COLUMNS = ["id", SYNC_UPDATED_AT_COLUMN]
+# How long a write may take to commit after its row is stamped; see sql/table_versions.sql.
+SYNC_LOOKBACK_SECONDS = 10
+
+def shift_timestamp(stamp, seconds):
+    return (pd.Timestamp(stamp) + pd.Timedelta(seconds=seconds)).isoformat()
+
+def normalize_dispatch_frame(df_loaded, display_columns, numeric_columns):
+    for col in display_columns:
+        if col not in df_loaded.columns:
+            if col in numeric_columns:
+                df_loaded[col] = 0.0
+            elif col == "Date":
+                df_loaded[col] = pd.NaT
+            else:
+                df_loaded[col] = ""
+    df_loaded["Date"] = pd.to_datetime(df_loaded["Date"], errors='coerce')
+    for col in numeric_columns:
+        df_loaded[col] = pd.to_numeric(df_loaded[col], errors='coerce').fillna(0.0)
+    for col in df_loaded.columns:
+        if col not in SYNC_KEY_COLUMNS + ["Date"] + numeric_columns:
+            df_loaded[col] = df_loaded[col].astype(str)
+    key_columns = [col for col in SYNC_KEY_COLUMNS if col in df_loaded.columns]
+    return df_loaded[key_columns + display_columns]
+
+def empty_dispatch_frame(display_columns, numeric_columns):
+    empty_df = pd.DataFrame(columns=["id"] + display_columns)
+    empty_df["id"] = pd.Series(dtype='int64')
+    empty_df["Date"] = pd.to_datetime(pd.Series(dtype='datetime64[ns]'))
+    for col in numeric_columns:
+        empty_df[col] = pd.Series(dtype='float64')
+    return empty_df
+
+# --- Compact frame dtypes ---
+CATEGORICAL_COLUMNS = ["Tech", "Site", "SLA"]
+
+def compact_dispatch_frame(df, numeric_columns):
+    # Long-lived frames keep low-cardinality text as categories, ids as int32 and money/hours
+    # as float32 wherever every value survives the round trip to the cent; the updated-at
+    # strings are only needed for the sync watermark and are dropped.
+    compact_df = df.drop(columns=[SYNC_UPDATED_AT_COLUMN], errors="ignore")
+    for col in CATEGORICAL_COLUMNS:
+        if col in compact_df.columns:
+            compact_df[col] = compact_df[col].astype("category")
+    if "id" in compact_df.columns and len(compact_df) and compact_df["id"].max() < 2 ** 31:
+        compact_df["id"] = compact_df["id"].astype("int32")
+    for col in numeric_columns:
+        values = compact_df[col]
+        if values.dtype == "float64" and values.astype("float32").astype("float64").round(2).equals(values):
+            compact_df[col] = values.astype("float32")
+    return compact_df
+
+def editor_dispatch_frame(df):
+    # Inverse of compact_dispatch_frame, so the editor and the write path see str and float64.
+    restored_columns = {}
+    for col, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            # Mapping codes through the category index is an order of magnitude faster than astype(str);
+            # missing values (code -1) are filled back in as NaN rather than taken from the end.
+            restored_columns[col] = pd.Series(dtype.categories.astype(str).take(
+                df[col].cat.codes.to_numpy(), allow_fill=True, fill_value=np.nan), index=df.index)
+        elif dtype == "float32":
+            restored_columns[col] = df[col].astype("float64").round(2)
+    return df.assign(**restored_columns) if restored_columns else df
+
+# --- Per-page column projections ---
+PAGE_QUERY_COLUMNS = {
+    "PAGE_1": {
+        "badging_dispatches": SYNC_KEY_COLUMNS + BADGING_COLUMNS},
+    "PAGE_2": {
+        "live_dispatches": SYNC_KEY_COLUMNS + LIVE_DISPATCHES_COLUMNS},
+    "PAGE_3": {
+        "badging_dispatches": ["Total"],
+        "names_and_sites": ["Name", "Site", "Badge"]},
+    "PAGE_4": {
+        "live_dispatches": ["Date", "SLA", "Site", "Total FN Pay", "Total DXC Pay", "PNL"]}}
+
+def quote_column(col):
+    return col if col.replace("_", "").isalnum() else f'"{col}"'
+
+@st.cache_resource
+def get_missing_columns():
+    # (table, column) pairs a version probe found missing, e.g. updated_at before
+    # sql/table_versions.sql is applied.
+    return set()
+
+def available_select(table_name, columns):
+    # Drops from a select list the columns the table turned out not to have; without
+    # updated_at a table still loads, and every sync is a full refresh.
+    missing_columns = get_missing_columns()
+    return ",".join(col for col in columns.split(",") if (table_name, col.strip('"')) not in missing_columns)
+
+def page_select(page_name, table_name):
+    return available_select(table_name, ",".join(quote_column(col) for col in PAGE_QUERY_COLUMNS[page_name][table_name]))
+
+# --- Table versions ---
+TABLE_VERSION_TTL_SECONDS = 5
+
+@instrumented_cache_data(ttl=TABLE_VERSION_TTL_SECONDS)
+def table_version(table_name):
+    # One request returns the exact row count, which moves on deletes, and the newest
+    # updated-at, which moves on inserts and edits. Tables without the column fall back to
+    # the highest id. The short TTL bounds probes to one per table every few seconds. An
+    # unreachable backend raises, so callers can serve what they already have.
+    for version_column in (SYNC_UPDATED_AT_COLUMN, "id"):
+        try:
+            response = (supabase.table(table_name).select(version_column, count="exact")
+                        .order(version_column, desc=True, nullsfirst=False).limit(1).execute())
+            return response.count, response.data[0][version_column] if response.data else None
+        except Exception as e:
+            if is_transient_error(e):
+                raise
+            if getattr(e, "code", None) == "42703":
+                get_missing_columns().add((table_name, version_column))
+    return None
+
+# --- Snapshot store ---
+SNAPSHOT_DIR = os.environ.get("DISPATCH_SNAPSHOT_DIR", ".snapshots")
+
+class SnapshotStore:
+    """Arrow IPC copies of the synced tables on local disk, tagged with the select list
+    they were loaded with and their sync watermark, so a restarted process can
+    memory-map its last snapshot and fetch only the rows changed since."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot-store")
+
+    def path(self, table_name):
+        return os.path.join(self.directory, f"{table_name.replace(' ', '_')}.arrow")
+
+    def load(self, table_name, columns):
+        import pyarrow as pa
+        try:
+            with pa.memory_map(self.path(table_name)) as source:
+                table = pa.ipc.open_file(source).read_all()
+            saved_at = os.path.getmtime(self.path(table_name))
+        except (OSError, pa.ArrowInvalid):
+            return None
+        metadata = table.schema.metadata or {}
+        if metadata.get(b"columns", b"").decode() != columns:
+            return None
+        return table.to_pandas(), metadata.get(b"watermark", b"").decode() or None, saved_at
+
+    def save(self, table_name, columns, df, watermark):
+        # Frames are never modified in place, so the write can run after the caller moves on.
+        # A single writer keeps saves in order; the rename makes each one atomic.
+        self.executor.submit(contextvars.Context().run, self._write, table_name, columns, df, watermark)
+
+    def _write(self, table_name, columns, df, watermark):
+        import pyarrow as pa
+        path = self.path(table_name)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with diagnostic_span("snapshot", f"{table_name} save") as event:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                table = table.replace_schema_metadata(
+                    {**(table.schema.metadata or {}), b"columns": columns.encode(), b"watermark": (watermark or "").encode()})
+                os.makedirs(self.directory, exist_ok=True)
+                with pa.OSFile(temp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+                os.replace(temp_path, path)
+                event["rows"], event["bytes"] = len(df), os.path.getsize(path)
+        except Exception:
+            # A read-only or full disk only costs the next restart a full load.
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+@st.cache_resource
+def get_snapshot_store():
+    return SnapshotStore(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+
+# --- Incremental delta sync ---
+class SyncedTable:
+    """Process-wide copy of a table, kept current by pulling only rows whose
+    updated-at timestamp is at or past the last sync watermark, less a short lookback
+    margin. Each load or sync that changes rows swaps in a new frame and bumps the
+    version; frames are never modified in place, so every session can render the same
+    snapshot."""
+
+    def __init__(self, table_name, columns, display_columns, numeric_columns, order_by=None, store=None):
+        self.table_name = table_name
+        self.columns = columns
+        self.display_columns = display_columns
+        self.numeric_columns = numeric_columns
+        self.order_by = order_by
+        self.store = store
+        self.df = None
+        self.version = 0
+        self.watermark = None
+        self.source_version = None
+        self.synced_at = None
+        self.recent_stamps = {}
+        self.settled = True
+        self.lock = threading.Lock()
+
+    def load(self):
+        return self.snapshot()[1]
+
+    def snapshot(self):
+        # A loaded copy is checked against the table's version probe and brought up to date
+        # with a delta sync when another session or process has written to the table. When
+        # the backend cannot be reached, the loaded copy is served as it is, marked with its
+        # age, and synced again in the background.
+        if self.df is None and self.store is not None:
+            self._restore()
+        try:
+            source_version = table_version(self.table_name)
+            if self.df is not None and (source_version != self.source_version or not self.settled):
+                self.sync(source_version)
+            elif self.df is not None:
+                self.synced_at = time.time()
+        except Exception as e:
+            if self.df is None or not is_transient_error(e):
+                raise
+            note_stale_data(self.table_name, self.synced_at)
+            get_prefetch_scheduler().submit(f"{self.table_name} sync", self.sync)
+            source_version = self.source_version
+        with diagnostic_span("loader", f"{self.table_name} snapshot") as event, self.lock:
+            event["cache"] = "hit" if self.df is not None else "miss"
+            if self.df is None:
+                self.source_version = source_version
+                self._full_refresh()
+                event["rows"], event["dataframe_bytes"] = result_size(self.df)
+            return self.version, self.df
+
+    def sync(self, source_version=None):
+        if source_version is None:
+            source_version = table_version(self.table_name)
+        with diagnostic_span("loader", f"{self.table_name} sync"), self.lock:
+            if self.df is None or self.watermark is None:
+                self._full_refresh()
+                synced_rows = len(self.df)
+            else:
+                # The delta re-reads a margin behind the watermark, for writes that committed after
+                # the last sync with an earlier stamp; rows already merged at their stamp are skipped.
+                filters = [("gte", SYNC_UPDATED_AT_COLUMN, shift_timestamp(self.watermark, -SYNC_LOOKBACK_SECONDS))]
+                pages = list(iter_table_pages(self.table_name, self.columns, filters))
+                delta = pd.concat(pages, ignore_index=True) if pages else pd.DataFrame()
+                if not delta.empty:
+                    delta = delta[[self.recent_stamps.get(row_id) != stamp
+                                   for row_id, stamp in zip(delta["id"], delta[SYNC_UPDATED_AT_COLUMN])]]
+                synced_rows = len(delta)
+                if not delta.empty:
+                    self.watermark = max(self.watermark, delta[SYNC_UPDATED_AT_COLUMN].max())
+                    self._remember_stamps(delta)
+                    self._merge(self._normalize(delta))
+                # Deleted rows never show up in a delta, so a row count that disagrees with the probe means a full reload.
+                if source_version is not None and source_version[0] != len(self.df):
+                    self._full_refresh()
+                    synced_rows = len(self.df)
+            # Only a completed sync counts as being at this version.
+            self.source_version = source_version
+            self.synced_at = time.time()
+            self.settled = self._settled()
+            return synced_rows
+
+    def _settled(self):
+        # A late commit inside the margin moves neither the probe's count nor its newest stamp,
+        # so syncs continue until one starts a full margin past the watermark.
+        return self.watermark is None or time.time() >= pd.Timestamp(self.watermark).timestamp() + SYNC_LOOKBACK_SECONDS
+
+    def _remember_stamps(self, df_loaded):
+        threshold = shift_timestamp(self.watermark, -SYNC_LOOKBACK_SECONDS)
+        recent = df_loaded[df_loaded[SYNC_UPDATED_AT_COLUMN] >= threshold]
+        self.recent_stamps = {row_id: stamp for row_id, stamp in self.recent_stamps.items() if stamp >= threshold}
+        self.recent_stamps.update(zip(recent["id"], recent[SYNC_UPDATED_AT_COLUMN]))
+
+    def _restore(self):
+        # A snapshot left on disk by an earlier process; the caller's sync then pulls what
+        # changed since its watermark, or reloads if rows were deleted meanwhile.
+        with diagnostic_span("snapshot", f"{self.table_name} restore") as event, self.lock:
+            restored = self.store.load(self.table_name, self.columns) if self.df is None else None
+            if restored is not None:
+                self.df, self.watermark, self.synced_at = restored
+                self.version += 1
+                event["rows"], event["dataframe_bytes"] = result_size(self.df)
+
+    def _persist(self):
+        if self.store is not None:
+            self.store.save(self.table_name, self.columns, self.df, self.watermark)
+
+    def _full_refresh(self):
+        df_loaded = fetch_table_paginated(self.table_name, columns=available_select(self.table_name, self.columns), order_by=self.order_by)
+        self.version += 1
+        self.synced_at = time.time()
+        self.recent_stamps = {}
+        if df_loaded.empty:
+            self.df = empty_dispatch_frame(self.display_columns, self.numeric_columns)
+            self.watermark = None
+            self.settled = True
+            return
+        # Without an updated-at column every sync falls back to a full refresh.
+        self.watermark = df_loaded[SYNC_UPDATED_AT_COLUMN].max() if SYNC_UPDATED_AT_COLUMN in df_loaded.columns else None
+        if self.watermark is not None:
+            self._remember_stamps(df_loaded)
+        self.settled = self._settled()
+        self.df = self._normalize(df_loaded)
+        self._persist()
+
+    def _normalize(self, df_loaded):
+        return compact_dispatch_frame(
+            normalize_dispatch_frame(df_loaded, self.display_columns, self.numeric_columns), self.numeric_columns)
+
+    def _merge(self, delta):
+        merged = pd.concat([self.df[~self.df["id"].isin(delta["id"])], delta], ignore_index=True)
+        if self.order_by is not None:
+            merged = merged.sort_values(self.order_by, kind="stable", ignore_index=True)
+        # Concatenating categoricals with different categories falls back to object.
+        self.df = compact_dispatch_frame(merged, self.numeric_columns)
+        self.version += 1
+        self._persist()
+
+SYNCED_TABLE_SPECS = {
+    "badging_dispatches": ("PAGE_1", BADGING_COLUMNS, BADGING_NUMERIC_COLUMNS),
+    "live_dispatches": ("PAGE_2", LIVE_DISPATCHES_COLUMNS, LIVE_DISPATCHES_NUMERIC_COLUMNS)}
+
+@st.cache_resource
+def get_synced_table(table_name):
+    page_name, display_columns, numeric_columns = SYNCED_TABLE_SPECS[table_name]
+    return SyncedTable(
+        table_name, page_select(page_name, table_name), display_columns, numeric_columns, order_by="Date", store=get_snapshot_store())
+
+# --- Editor change tracking ---
+def track_editor_changes(editor_key, base_df, numeric_columns, dirty_key, row_ids=None):
+    # Folds the editor's edited_rows delta into the session's dirty set,
+    # {row id: {"cells": {column: (old, new)}}}, so a rerun costs O(edits) rather than
+    # O(table). Entries are keyed by id and survive paging between windows; cells edited
+    # back to their original value drop out of the set. Edits are positional: row_ids gives
+    # the ids the editor showed when that was not base_df, whose rows are then found by id
+    # (an edit to a row base_df no longer holds is kept as it is).
+    dirty_rows = st.session_state.setdefault(dirty_key, {})
+    edited_rows = st.session_state.get(editor_key, {}).get("edited_rows", {})
+    if row_ids is not None and edited_rows:
+        edited_ids = [int(row_ids[int(row_idx)]) for row_idx in edited_rows]
+        base_positions = dict(zip(edited_ids, pd.Index(base_df["id"]).get_indexer(edited_ids)))
+    for row_idx, updated_values in edited_rows.items():
+        if row_ids is None:
+            base_row = base_df.iloc[int(row_idx)]
+            row_id = int(base_row["id"])
+        else:
+            row_id = int(row_ids[int(row_idx)])
+            base_row = base_df.iloc[base_positions[row_id]] if base_positions[row_id] >= 0 else None
+        dirty_row = dirty_rows.get(row_id) or {"cells": {}}
+        for col, new_value in updated_values.items():
+            old_value = base_row[col] if base_row is not None else None
+            if base_row is None or serialize_cell(col, old_value, numeric_columns) != serialize_cell(col, new_value, numeric_columns):
+                dirty_row["cells"][col] = (old_value, new_value)
+            else:
+                dirty_row["cells"].pop(col, None)
+        if dirty_row["cells"]:
+            dirty_rows[row_id] = dirty_row
+        else:
+            dirty_rows.pop(row_id, None)
+    return dirty_rows
+
+def editor_cell_value(col, value, numeric_columns):
+    if col == "Date":
+        return pd.to_datetime(value) if pd.notna(value) else pd.NaT
+    if col in numeric_columns:
+        return float(value) if pd.notna(value) else float("nan")
+    return str(value) if pd.notna(value) else None
+
+def apply_dirty_overlay(df, dirty_rows, numeric_columns):
+    # Re-applies unsaved edits to a freshly fetched window or a newer shared snapshot, so
+    # edits survive paging and other sessions' saves.
+    if not dirty_rows:
+        return df
+    dirty_mask = df["id"].isin(list(dirty_rows))
+    if not dirty_mask.any():
+        return df
+    df = df.copy()
+    for position in dirty_mask.to_numpy().nonzero()[0]:
+        for col, (old_value, new_value) in dirty_rows[int(df["id"].iat[position])]["cells"].items():
+            df.iat[position, df.columns.get_loc(col)] = editor_cell_value(col, new_value, numeric_columns)
+    return df
+
+def clear_editor_changes(editor_key, dirty_key):
+    st.session_state.pop(editor_key, None)
+    st.session_state.pop(dirty_key, None)
+
+def clear_saved_changes(editor_key, dirty_key, saved_ids, failures):
+    # Rows that failed to save stay in the dirty set so the next save retries them;
+    # rows deleted since they were loaded cannot be saved and are dropped.
+    st.session_state.pop(editor_key, None)
+    dirty_rows = st.session_state.get(dirty_key, {})
+    for row_id in saved_ids:
+        dirty_rows.pop(row_id, None)
+    for row_id, failure in failures.items():
+        if failure == DELETED_ROW_FAILURE:
+            dirty_rows.pop(row_id, None)
+
+def carry_over_editor_changes(editor_key, base_df, page_key, numeric_columns, dirty_key):
+    # The editor is re-keyed whenever the rows it shows change (a newer snapshot, a refreshed
+    # window, other filters). An edit made in the previous run is still under the previous key,
+    # so it is folded into the dirty set through the ids that run showed before that key goes.
+    # Only those ids are kept, never the frame, so no session holds an old snapshot alive.
+    previous_key = st.session_state.get(f"editor_key_{page_key}")
+    if previous_key is not None and previous_key != editor_key:
+        previous_ids = st.session_state.get(f"editor_ids_{page_key}")
+        if st.session_state.get(previous_key, {}).get("edited_rows") and previous_ids is not None:
+            track_editor_changes(previous_key, base_df, numeric_columns, dirty_key, row_ids=previous_ids)
+        st.session_state.pop(previous_key, None)
+    st.session_state[f"editor_key_{page_key}"] = editor_key
+    st.session_state[f"editor_ids_{page_key}"] = base_df["id"].to_numpy()
+    return st.session_state.get(dirty_key, {})
+
+def show_dirty_warning(dirty_rows):
+    if dirty_rows:
+        dirty_cell_count = sum(len(dirty_row["cells"]) for dirty_row in dirty_rows.values())
+        st.warning(f"Data in the table has been modified ({dirty_cell_count} cell(s) in {len(dirty_rows)} row(s)). Click 'Save All Changes to Supabase' to persist.")
+
+# --- Windowed editor paging ---
+EDITOR_PAGE_SIZES = [50, 100, 250, 500]
+
+def render_dispatch_filters(key_prefix, tech_options, site_options, sla_options=None, ticket_search=False):
+    reset_page = lambda: st.session_state.update({f"{key_prefix}_page_number": 1})
+    filter_columns = st.columns((4 if sla_options else 3) + ticket_search)
+    date_range = filter_columns[0].date_input("Date range:", value=(), key=f"{key_prefix}_filter_dates", on_change=reset_page)
+    selected_techs = filter_columns[1].multiselect("Tech:", tech_options, key=f"{key_prefix}_filter_techs", on_change=reset_page)
+    selected_sites = filter_columns[2].multiselect("Site:", site_options, key=f"{key_prefix}_filter_sites", on_change=reset_page)
+    selected_slas = filter_columns[3].multiselect("SLA:", sla_options, key=f"{key_prefix}_filter_slas", on_change=reset_page) if sla_options else []
+    search_text = filter_columns[-1].text_input("Find ticket:", key=f"{key_prefix}_filter_search",
+                                                help="Ticket ID, or part of a tech or site name.") if ticket_search else ""
+    return {"date_range": tuple(date_range), "Tech": selected_techs, "Site": selected_sites, "SLA": selected_slas, "search": search_text}
+
+def dispatch_filter_clauses(filter_spec):
+    filters = []
+    if len(filter_spec["date_range"]) == 2:
+        start_date, end_date = filter_spec["date_range"]
+        filters += [("gte", "Date", start_date.isoformat()), ("lte", "Date", end_date.isoformat())]
+    for col in ["Tech", "Site", "SLA"]:
+        if filter_spec[col]:
+            filters.append(("in_", col, tuple(filter_spec[col])))
+    return tuple(filters)
+
+def render_page_controls(key_prefix):
+    size_column, page_column = st.columns(2)
+    page_size = size_column.selectbox("Rows per page:", EDITOR_PAGE_SIZES, index=1, key=f"{key_prefix}_page_size",
+                                      on_change=lambda: st.session_state.update({f"{key_prefix}_page_number": 1}))
+    page_number = page_column.number_input("Page:", min_value=1, value=1, step=1, key=f"{key_prefix}_page_number")
+    return page_size, int(page_number)
+
+def window_editor_key(editor_key, *window):
+    # Each window gets its own editor so that positional edits never leak onto another page.
+    # Paged windows pass their row ids too: a refreshed window whose rows shifted is a new window.
+    window_token = hashlib.md5(repr(window).encode()).hexdigest()[:10]
+    return f"{editor_key}_{window_token}"
+
+@instrumented_cache_data(tables=list(SYNCED_TABLE_SPECS), serve_stale=True, max_entries=64)
+def load_dispatch_window(table_name, columns, filters, page_number, page_size):
+    _, display_columns, numeric_columns = SYNCED_TABLE_SPECS[table_name]
+    start = (page_number - 1) * page_size
+    query = apply_filters(supabase.table(table_name).select(columns, count="exact"), filters)
+    response = query.order("Date").order("id").range(start, start + page_size - 1).execute()
+    df_window = pd.DataFrame(response.data or [])
+    if df_window.empty:
+        return empty_dispatch_frame(display_columns, numeric_columns), response.count or 0
+    return normalize_dispatch_frame(df_window, display_columns, numeric_columns), response.count or 0
+
+def load_editor_window(table_name, page_name, filters, page_number, page_size):
+    columns = page_select(page_name, table_name)
+    base_df, matching_rows = load_dispatch_window(table_name, columns, filters, page_number, page_size)
+    last_page = max(1, math.ceil(matching_rows / page_size))
+    if page_number > last_page:
+        page_number = last_page
+        base_df, matching_rows = load_dispatch_window(table_name, columns, filters, page_number, page_size)
+    st.caption(f"Page {page_number} of {last_page} ({matching_rows} matching rows)")
+    return base_df, page_number
+
+# --- Indexed snapshot filters ---
+class SnapshotIndex:
+    """Row indexes over one version of a synced snapshot, so the filter bar composes masks
+    instead of scanning the frame: per-category row lists and bitmaps for Tech/Site/SLA, and
+    the dates and ids in sorted order for binary search."""
+
+    def __init__(self, df):
+        self.row_count = len(df)
+        self.category_codes, self.category_names, self.category_rows, self.category_bounds, self.category_bitmaps = {}, {}, {}, {}, {}
+        for col in CATEGORICAL_COLUMNS:
+            if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+                categories = df[col].cat.categories.astype(str).tolist()
+                codes = df[col].cat.codes.to_numpy()
+                rows = np.argsort(codes, kind="stable")
+                self.category_codes[col] = {value: code for code, value in enumerate(categories)}
+                self.category_names[col] = [value.lower() for value in categories]
+                self.category_rows[col] = rows
+                # Rows of category code c are rows[bounds[c]:bounds[c + 1]]; missing values (-1) sort first.
+                bounds = self.category_bounds[col] = np.searchsorted(codes[rows], np.arange(len(categories) + 1))
+                # Values covering over an eighth of the rows (at most eight per column) also get a
+                # prebuilt bitmap, which is cheaper to combine than their row lists are to scatter.
+                common_codes = np.flatnonzero(np.diff(bounds) * 8 > self.row_count)
+                self.category_bitmaps[col] = {int(code): codes == code for code in common_codes}
+        dates = df["Date"].to_numpy(dtype="datetime64[ns]")
+        self.date_rows = np.argsort(dates, kind="stable")
+        self.sorted_dates = dates[self.date_rows]
+        ids = df["id"].to_numpy(dtype="int64")
+        self.id_rows = np.argsort(ids, kind="stable")
+        self.sorted_ids = ids[self.id_rows]
+
+    def rows_mask(self, rows):
+        mask = np.zeros(self.row_count, dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def category_mask(self, col, codes):
+        if col not in self.category_rows:
+            return np.zeros(self.row_count, dtype=bool)
+        rows, bounds, bitmaps = self.category_rows[col], self.category_bounds[col], self.category_bitmaps[col]
+        mask = self.rows_mask(np.concatenate([rows[bounds[code]:bounds[code + 1]] for code in codes if code not in bitmaps] or [rows[:0]]))
+        for code in codes:
+            if code in bitmaps:
+                mask |= bitmaps[code]
+        return mask
+
+    def value_mask(self, col, values):
+        category_codes = self.category_codes.get(col, {})
+        return self.category_mask(col, [category_codes[value] for value in values if value in category_codes])
+
+    def date_mask(self, start_date, end_date):
+        start, end = np.searchsorted(self.sorted_dates, [
+            np.datetime64(start_date, "ns"), np.datetime64(end_date, "ns") + np.timedelta64(1, "D")])
+        return self.rows_mask(self.date_rows[start:end])
+
+    def search_mask(self, text):
+        # A ticket ID matches exactly; otherwise any tech or site whose name contains the text.
+        mask = np.zeros(self.row_count, dtype=bool)
+        if text.isdigit():
+            start, end = np.searchsorted(self.sorted_ids, [int(text), int(text) + 1])
+            mask[self.id_rows[start:end]] = True
+        text = text.lower()
+        for col in ("Tech", "Site"):
+            if col in self.category_rows:
+                codes = [code for code, name in enumerate(self.category_names[col]) if text in name]
+                mask |= self.category_mask(col, codes)
+        return mask
+
+    def matching_rows(self, filter_spec):
+        # Positions of the rows matching every active filter, in frame order; None when no filter is set.
+        masks = []
+        if len(filter_spec["date_range"]) == 2:
+            masks.append(self.date_mask(*filter_spec["date_range"]))
+        for col in CATEGORICAL_COLUMNS:
+            if filter_spec[col]:
+                masks.append(self.value_mask(col, filter_spec[col]))
+        if filter_spec["search"].strip():
+            masks.append(self.search_mask(filter_spec["search"].strip()))
+        if not masks:
+            return None
+        return np.flatnonzero(np.logical_and.reduce(masks))
+
+@st.cache_resource(max_entries=4)
+def get_snapshot_index(table_name, snapshot_version, _snapshot_df):
+    # Built once per snapshot version and shared by every session showing it.
+    with diagnostic_span("loader", f"{table_name} index"):
+        return SnapshotIndex(_snapshot_df)
+
+def filter_snapshot(table_name, snapshot_version, snapshot_df, filter_spec):
+    matching_rows = get_snapshot_index(table_name, snapshot_version, snapshot_df).matching_rows(filter_spec)
+    if matching_rows is None:
+        return snapshot_df
+    st.caption(f"{len(matching_rows)} of {len(snapshot_df)} rows match the filters")
+    return snapshot_df.take(matching_rows).reset_index(drop=True)
+
+# --- Batched writes ---
+WRITE_CHUNK_SIZE = 200
+WRITE_MAX_WORKERS = 4
+
+BULK_UPDATE_RPC = "bulk_update_rows"
+DELETED_ROW_FAILURE = "deleted since it was loaded"
+
+def serialize_cell(col, value, numeric_columns):
+    if pd.isna(value):
+        return None
+    if col == "Date":
+        return pd.to_datetime(value).strftime('%Y-%m-%d')
+    if col in numeric_columns:
+        return float(value)
+    return str(value)
+
+def build_update_groups(dirty_rows, numeric_columns):
+    # Only the cells the user changed are written, so a save never reverts another
+    # dispatcher's change to the row's other cells. Rows are grouped by the columns
+    # they change, {changed columns: [{"id": ..., column: value}]}, so each group
+    # still goes out as uniform bulk requests.
+    update_groups = {}
+    for row_id, dirty_row in dirty_rows.items():
+        row = {"id": row_id}
+        for col, (old_value, new_value) in dirty_row["cells"].items():
+            row[col] = serialize_cell(col, new_value, numeric_columns)
+        update_groups.setdefault(tuple(sorted(dirty_row["cells"])), []).append(row)
+    return update_groups
+
+def write_update_chunk(table_name, changed_columns, rows):
+    # One bulk_update_rows call (sql/bulk_update_rows.sql) per chunk: a plain UPDATE of the
+    # changed columns, so rows deleted since they were loaded are reported, not inserted again.
+    # Without the function, or when it rejects the chunk (which rolls it back), the rows are
+    # sent as per-row updates to tell the good rows from the bad ones.
+    missing_rpcs = get_missing_rpcs()
+    if BULK_UPDATE_RPC not in missing_rpcs:
+        try:
+            response = supabase.rpc(BULK_UPDATE_RPC, {
+                "target_table": table_name, "changed_columns": list(changed_columns), "changes": rows}).execute()
+            updated_ids = {row["id"] for row in response.data or []}
+            return ([row["id"] for row in rows if row["id"] in updated_ids],
+                    {row["id"]: DELETED_ROW_FAILURE for row in rows if row["id"] not in updated_ids})
+        except Exception as e:
+            if getattr(e, "code", None) == "PGRST202":
+                missing_rpcs.add(BULK_UPDATE_RPC)
+    saved_ids, failures = [], {}
+    for row in rows:
+        row_values = {col: value for col, value in row.items() if col != "id"}
+        try:
+            response = supabase.table(table_name).update(row_values).eq("id", row["id"]).execute()
+            if response.data:
+                saved_ids.append(row["id"])
+            else:
+                failures[row["id"]] = DELETED_ROW_FAILURE
+        except Exception as e:
+            failures[row["id"]] = str(e)
+    return saved_ids, failures
+
+def bulk_update_rows(table_name, update_groups, chunk_size=WRITE_CHUNK_SIZE, max_workers=WRITE_MAX_WORKERS):
+    chunks = [(changed_columns, rows[start:start + chunk_size])
+              for changed_columns, rows in update_groups.items() for start in range(0, len(rows), chunk_size)]
+    saved_ids, failures = [], {}
+    if not chunks:
+        return saved_ids, failures
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        futures = [submit_with_context(executor, write_update_chunk, table_name, changed_columns, chunk)
+                   for changed_columns, chunk in chunks]
+        for chunk_saved_ids, chunk_failures in (future.result() for future in futures):
+            saved_ids.extend(chunk_saved_ids)
+            failures.update(chunk_failures)
+    return saved_ids, failures
+
+def show_save_summary(summary_key):
+    summary = st.session_state.pop(summary_key, None)
+    if summary is None:
+        return
+    saved_ids, failures = summary
+    if saved_ids:
+        st.success(f"Saved {len(saved_ids)} row(s) to Supabase.")
+    if failures:
+        st.error(f"Failed to save {len(failures)} row(s): " + "; ".join(f"ID {row_id}: {error}" for row_id, error in failures.items())
+                 + ". Edits to rows that still exist are kept; save again to retry them.")
+
+# --- Report exports ---
+EXPORT_FORMATS = {
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet")}
+EXPORT_SPOOL_BYTES = 16 * 1024 * 1024
+
+def iter_table_pages(table_name, columns, filters=(), page_size=FETCH_PAGE_SIZE):
+    # Keyset pagination on id keeps every page an index range scan, however deep the export goes.
+    last_id = None
+    while True:
+        page_filters = tuple(filters) + ((("gt", "id", last_id),) if last_id is not None else ())
+        df_page = fetch_table_page(table_name, columns, 0, page_size - 1, page_filters)
+        if df_page.empty:
+            return
+        yield df_page
+        if len(df_page) < page_size:
+            return
+        last_id = int(df_page["id"].iloc[-1])
+
+def excel_rows(frame):
+    # Date-only timestamps are written as dates so Excel does not show a midnight time.
+    date_columns = {
+        col: frame[col].dt.date for col in frame.columns
+        if pd.api.types.is_datetime64_any_dtype(frame[col]) and (frame[col].dropna() == frame[col].dropna().dt.normalize()).all()}
+    frame = frame.assign(**date_columns).astype(object)
+    return frame.where(frame.notna(), None).itertuples(index=False, name=None)
+
+def write_export(sheets, export_format):
+    # sheets is [(sheet name, iterable of DataFrames)], consumed one frame at a time into a
+    # spooled file, so only the current page and the encoded output are in memory. CSV and
+    # Parquet hold a single table and take the first sheet. The download button takes bytes
+    # (not a spooled file), so the finished file is read back whole.
+    output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    if export_format == "Excel":
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        for sheet_name, frames in sheets:
+            worksheet = workbook.create_sheet(sheet_name[:31])
+            for frame_number, frame in enumerate(frames):
+                if frame_number == 0:
+                    worksheet.append([str(col) for col in frame.columns])
+                for row in excel_rows(frame):
+                    worksheet.append(row)
+        workbook.save(output)
+    elif export_format == "Parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        for frame in sheets[0][1]:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output, table.schema)
+            writer.write_table(table.cast(writer.schema))
+        if writer is not None:
+            writer.close()
+    else:
+        text_output = io.TextIOWrapper(output, encoding="utf-8", newline="")
+        for frame_number, frame in enumerate(sheets[0][1]):
+            frame.to_csv(text_output, header=frame_number == 0, index=False)
+        text_output.flush()
+        text_output.detach()
+    output.seek(0)
+    with output:
+        return output.read()
+
+def dispatch_detail_export(filters, export_format):
+    columns = page_select("PAGE_2", "live_dispatches")
+    def pages():
+        page_count = 0
+        for df_page in iter_table_pages("live_dispatches", columns, filters):
+            page_count += 1
+            yield normalize_dispatch_frame(df_page, LIVE_DISPATCHES_COLUMNS, LIVE_DISPATCHES_NUMERIC_COLUMNS)[["id"] + LIVE_DISPATCHES_COLUMNS]
+        if not page_count:
+            # No matching rows: an empty page of the same projection still writes the CSV or
+            # Excel header and the Parquet schema, so the file opens as an empty table.
+            yield normalize_dispatch_frame(
+                empty_dispatch_frame(LIVE_DISPATCHES_COLUMNS, LIVE_DISPATCHES_NUMERIC_COLUMNS), LIVE_DISPATCHES_COLUMNS, LIVE_DISPATCHES_NUMERIC_COLUMNS)
+    return write_export([("Dispatch Detail", pages())], export_format)
+
+def pnl_summary_sheets(pnl_rollup):
+    months = pnl_rollup["months"]
+    monthly = pd.DataFrame(
+        [{"Month": month, "Tickets": month_rollup["Tickets"], **{measure: month_rollup[measure] for measure in PNL_MEASURES}}
+         for month, month_rollup in months.items()], columns=["Month", "Tickets"] + PNL_MEASURES)
+    def monthly_counts(counts_key, label):
+        return pd.DataFrame(
+            [{"Month": month, label: key, "Tickets": int(count)}
+             for month, month_rollup in months.items() for key, count in month_rollup[counts_key].items()],
+            columns=["Month", label, "Tickets"])
+    return [
+        ("Monthly P&L", [monthly]),
+        ("Monthly by SLA", [monthly_counts("sla_counts", "SLA")]),
+        ("Monthly by Site", [monthly_counts("site_counts", "Site")]),
+        ("Tickets by SLA", [pnl_rollup["sla_counts"].rename_axis("SLA").reset_index(name="Tickets")]),
+        ("Tickets by Site", [pnl_rollup["site_counts"].rename_axis("Site").reset_index(name="Tickets")])]
+
+def badge_progress_frame(site_counts, badge_summary):
+    progress = site_counts[["Site", "Total Techs", "YES", "NO"]].rename(columns={"YES": "Badged", "NO": "Not Badged"})
+    return progress.merge(badge_summary["site_summary_display"][["Site", "Badged (%)"]], on="Site", how="left")
+
+def render_export_button(label, export, file_stem, export_format, key):
+    # The export callable only runs when the button is clicked, on Streamlit's download thread.
+    extension, mime = EXPORT_FORMATS[export_format]
+    st.download_button(label, data=export, file_name=f"{file_stem}_{datetime.today():%Y%m%d}.{extension}", mime=mime, key=key)
+
+# --- Reference data ---
+REFERENCE_DATA_COLUMNS = ["Name", "Site"]
+class ReferenceData:
+    """Tech/Site option lists and a name -> site map built once per process from
+    names_and_sites, reloaded when the table's version changes or on request."""
+
+    def __init__(self):
+        self.tech_options = []
+        self.site_options = []
+        self.site_by_tech = {}
+        self.version = None
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def options(self):
+        try:
+            version = table_version("names_and_sites")
+        except Exception as e:
+            # The lists change rarely; keep offering the loaded ones while the backend is away.
+            if self.loaded and is_transient_error(e):
+                return self.tech_options, self.site_options
+            raise
+        with self.lock:
+            if not self.loaded or version != self.version:
+                self._load()
+                self.version = version
+            return self.tech_options, self.site_options
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded = False
+
+    def _load(self):
+        select_list = ",".join(quote_column(col) for col in REFERENCE_DATA_COLUMNS)
+        response = supabase.table("names_and_sites").select(select_list).execute()
+        df_names_sites = pd.DataFrame(response.data or [], columns=REFERENCE_DATA_COLUMNS)
+        self.tech_options = sorted(df_names_sites['Name'].dropna().unique().tolist())
+        self.site_options = sorted(df_names_sites['Site'].dropna().unique().tolist())
+        self.site_by_tech = dict(zip(df_names_sites['Name'], df_names_sites['Site']))
+        self.loaded = True
+
+@st.cache_resource
+def get_reference_data():
+    return ReferenceData()
+
+# --- Bulk import ---
+IMPORT_CHUNK_SIZE = 500
+IMPORT_MAX_WORKERS = 4
+IMPORT_REJECT_PREVIEW_ROWS = 200
+# Postgres data exceptions, integrity constraints and schema errors, and PostgREST request errors.
+IMPORT_REJECTION_CODE_PREFIXES = ("22", "23", "42", "PGRST")
+CANCEL_PRIORITY_OPTIONS = ["P4", "P3", "P2", "P1"]
+CANCELLATION_TYPE_OPTIONS = ["Outside 24 HRS", "24-8 HRS", "8-0 HRS"]
+IMPORT_TABLE_SPECS = {
+    "badging_dispatches": {
+        "columns": ["Date", "Tech", "Site", "Hours", "Additional", "Base"],
+        "required": ["Date", "Tech", "Site"],
+        "numeric": ["Hours", "Additional", "Base"],
+        "totals": {"Total": ["Base", "Additional"]}},
+    "live_dispatches": {
+        "columns": ["Date", "Tech", "Site", "SLA", "Hours", "Additional"],
+        "required": ["Date", "Tech", "Site", "SLA"],
+        "numeric": ["Hours", "Additional"],
+        "totals": {}},
+    "CANCEL WOS": {
+        "columns": ["Date", "Site", "Tech", "Priority", "Cancellation Type", "DXC Cost", "FN Pay", "Ticket #"],
+        "required": ["Date", "Site", "Tech", "Priority", "Cancellation Type", "Ticket #"],
+        "numeric": ["DXC Cost", "FN Pay"],
+        "totals": {}}}
+
+def iter_upload_chunks(uploaded_file, chunk_size=IMPORT_CHUNK_SIZE):
+    # Yields (chunk, fraction of the file read) with cells as text and the index set to the
+    # source row number, so neither format is ever loaded whole.
+    if uploaded_file.name.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+        workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+        try:
+            worksheet = workbook.active
+            rows = worksheet.iter_rows(values_only=True)
+            header = [str(value).strip() if value is not None else "" for value in next(rows, ())]
+            last_row = worksheet.max_row or 0
+            chunk, row_numbers = [], []
+            for row_number, values in enumerate(rows, start=2):
+                if all(value is None or str(value).strip() == "" for value in values):
+                    continue
+                chunk.append(list(values[:len(header)]) + [None] * (len(header) - len(values)))
+                row_numbers.append(row_number)
+                if len(chunk) == chunk_size:
+                    yield pd.DataFrame(chunk, columns=header, index=row_numbers), min(row_number / last_row, 1.0) if last_row else 0.0
+                    chunk, row_numbers = [], []
+            if chunk:
+                yield pd.DataFrame(chunk, columns=header, index=row_numbers), 1.0
+        finally:
+            workbook.close()
+    else:
+        for chunk in pd.read_csv(uploaded_file, dtype=str, keep_default_na=False, skip_blank_lines=False, chunksize=chunk_size):
+            chunk.index = chunk.index + 2
+            # Blank lines and rows of empty cells (",,,") are skipped, as the Excel path skips blank
+            # rows; they are read first so the index stays the source line number.
+            chunk = chunk[chunk.fillna("").apply(lambda values: values.str.strip() != "").any(axis=1)]
+            yield chunk, min(uploaded_file.tell() / uploaded_file.size, 1.0) if uploaded_file.size else 0.0
+
+def import_text(values):
+    return values.where(values.notna(), "").astype(str).str.strip()
+
+def normalize_import_chunk(chunk, spec, option_lists, site_by_tech):
+    # Returns ([(source row, row to insert)], {source row: reason}). Choice columns are matched
+    # case-insensitively against the option lists; a blank Site is taken from the Tech's roster entry.
+    canonical_columns = {col.lower(): col for col in spec["columns"]}
+    chunk = chunk.rename(columns=lambda col: canonical_columns.get(str(col).strip().lower(), col))
+    missing_columns = [col for col in spec["required"] if col not in chunk.columns and not (col == "Site" and site_by_tech)]
+    if missing_columns:
+        raise ValueError(f"The file is missing required column(s): {', '.join(missing_columns)}")
+    errors = pd.Series("", index=chunk.index)
+    def reject(mask, reasons):
+        mask = mask & errors.eq("")
+        errors[mask] = reasons[mask] if isinstance(reasons, pd.Series) else reasons
+    normalized = pd.DataFrame(index=chunk.index)
+    dates = pd.to_datetime(chunk["Date"], errors="coerce", format="mixed")
+    reject(dates.isna(), "invalid or missing Date")
+    normalized["Date"] = dates.dt.strftime('%Y-%m-%d')
+    text_columns = [col for col in spec["columns"] if col != "Date" and col not in spec["numeric"]]
+    for col in sorted(text_columns, key=lambda col: col != "Tech"):
+        values = import_text(chunk[col]) if col in chunk.columns else pd.Series("", index=chunk.index)
+        if col == "Site" and site_by_tech:
+            values = values.mask(values.eq(""), normalized["Tech"].map(site_by_tech).fillna(""))
+        if col in option_lists:
+            matched = values.str.lower().map({option.lower(): option for option in option_lists[col]})
+            reject(values.ne("") & matched.isna(), f"unknown {col} '" + values + "'")
+            values = matched.fillna(values)
+        if col in spec["required"]:
+            reject(values.eq(""), f"missing {col}")
+        normalized[col] = values
+    for col in spec["numeric"]:
+        values = import_text(chunk[col]).str.replace(r"[$,]", "", regex=True) if col in chunk.columns else pd.Series("", index=chunk.index)
+        numbers = pd.to_numeric(values.mask(values.eq(""), "0"), errors="coerce")
+        reject(numbers.isna() | (numbers < 0), f"invalid {col}")
+        normalized[col] = numbers.astype('float64')
+    for total_col, parts in spec["totals"].items():
+        normalized[total_col] = normalized[parts].sum(axis=1)
+    valid = errors.eq("")
+    rows = normalized[valid].to_dict("records")
+    return list(zip(normalized.index[valid].tolist(), rows)), errors[~valid].to_dict()
+
+def is_rejected_write(e):
+    # Data, constraint and schema errors: the database refused the rows and stored nothing.
+    return str(getattr(e, "code", None) or "").startswith(IMPORT_REJECTION_CODE_PREFIXES)
+
+def insert_import_chunk(table_name, numbered_rows):
+    # A rejected chunk inserts nothing, so it is retried row by row to keep the good rows. Any
+    # other failure (a timeout, a dropped connection) may have been committed all the same, so
+    # those rows are reported as unconfirmed rather than inserted a second time.
+    def unconfirmed(e):
+        return f"Outcome unknown, not retried (check the table before importing these rows again): {e}"
+    try:
+        supabase.table(table_name).insert([row for _, row in numbered_rows]).execute()
+        return len(numbered_rows), {}
+    except Exception as e:
+        if not is_rejected_write(e):
+            return 0, {source_row: unconfirmed(e) for source_row, _ in numbered_rows}
+    inserted, failures = 0, {}
+    for source_row, row in numbered_rows:
+        try:
+            supabase.table(table_name).insert([row]).execute()
+            inserted += 1
+        except Exception as e:
+            failures[source_row] = str(e) if is_rejected_write(e) else unconfirmed(e)
+    return inserted, failures
+
+def import_dispatch_file(table_name, uploaded_file, option_lists, site_by_tech):
+    # Parsing runs ahead of at most IMPORT_MAX_WORKERS chunk inserts in flight.
+    spec = IMPORT_TABLE_SPECS[table_name]
+    inserted, rejected = 0, {}
+    progress_bar = st.progress(0.0, text=f"Importing into {table_name}...")
+    pending = deque()
+    def collect(future):
+        nonlocal inserted
+        chunk_inserted, chunk_failures = future.result()
+        inserted += chunk_inserted
+        rejected.update(chunk_failures)
+    try:
+        with ThreadPoolExecutor(max_workers=IMPORT_MAX_WORKERS) as executor:
+            for chunk, fraction_read in iter_upload_chunks(uploaded_file):
+                numbered_rows, chunk_rejects = normalize_import_chunk(chunk, spec, option_lists, site_by_tech)
+                rejected.update(chunk_rejects)
+                if numbered_rows:
+                    pending.append(submit_with_context(executor, insert_import_chunk, table_name, numbered_rows))
+                while len(pending) >= IMPORT_MAX_WORKERS:
+                    collect(pending.popleft())
+                progress_bar.progress(fraction_read, text=f"Importing into {table_name}... {inserted} rows inserted")
+            while pending:
+                collect(pending.popleft())
+    finally:
+        progress_bar.empty()
+    return inserted, rejected
+
+def render_bulk_import(table_name, key_prefix, on_imported=None):
+    spec = IMPORT_TABLE_SPECS[table_name]
+    summary_key = f"{key_prefix}_import_summary"
+    upload_key = f"{key_prefix}_import_upload"
+    st.caption(f"Columns: {', '.join(spec['columns'])}. Required: {', '.join(spec['required'])}. "
+               "Column names are matched case-insensitively; a blank Site is filled from the tech's roster site.")
+    summary = st.session_state.pop(summary_key, None)
+    if summary is not None:
+        inserted, rejected = summary
+        if inserted:
+            st.success(f"Imported {inserted} row(s) into {table_name}.")
+        if rejected:
+            rejects_df = pd.DataFrame({"Row": list(rejected), "Reason": list(rejected.values())}).sort_values("Row")
+            st.error(f"{len(rejected)} row(s) were skipped or could not be confirmed. The first {min(len(rejected), IMPORT_REJECT_PREVIEW_ROWS)} are listed below.")
+            st.dataframe(rejects_df.head(IMPORT_REJECT_PREVIEW_ROWS), hide_index=True)
+            st.download_button("Download skipped rows", rejects_df.to_csv(index=False), file_name=f"{table_name}_skipped_rows.csv",
+                               mime="text/csv", key=f"{key_prefix}_import_rejects")
+    upload_version = st.session_state.get(upload_key, 0)
+    uploaded_file = st.file_uploader("CSV or Excel file:", type=["csv", "xlsx"], key=f"{upload_key}_{upload_version}")
+    if uploaded_file is not None and st.button("Import Rows", key=f"{key_prefix}_import_button"):
+        reference_data = get_reference_data()
+        try:
+            tech_options, site_options = reference_data.options()
+            option_lists = {"Tech": tech_options, "Site": site_options, "SLA": KNOWN_SLAS,
+                            "Priority": CANCEL_PRIORITY_OPTIONS, "Cancellation Type": CANCELLATION_TYPE_OPTIONS}
+            inserted, rejected = import_dispatch_file(table_name, uploaded_file, option_lists, reference_data.site_by_tech)
+        except ValueError as e:
+            st.error(str(e))
+            return
+        except Exception as e:
+            st.error(f"An error occurred while importing into {table_name}: {e}")
+            return
+        if inserted and on_imported is not None:
+            on_imported()
+        st.session_state[summary_key] = (inserted, rejected)
+        # A fresh uploader key drops the file, so the same rows cannot be imported twice by accident.
+        st.session_state[upload_key] = upload_version + 1
+        st.rerun()
+
+# --- Report aggregates ---
+BUDGET_TOTAL_RPC = "badging_budget_total"
+BADGE_COUNTS_RPC = "badge_counts_by_site"
+BADGE_NAMES_RPC = "badge_distinct_names"
+
+@st.cache_resource
+def get_missing_rpcs():
+    return set()
+
+def call_aggregate_rpc(function_name):
+    # Returns None when the function is not deployed or fails, so callers fall back to pandas.
+    # An unreachable backend raises instead: falling back to a full fetch would only be slower.
+    missing_rpcs = get_missing_rpcs()
+    if function_name in missing_rpcs:
+        return None
+    try:
+        return supabase.rpc(function_name).execute().data
+    except Exception as e:
+        if is_transient_error(e):
+            raise
+        if getattr(e, "code", None) == "PGRST202":
+            missing_rpcs.add(function_name)
+        return None
+
+def summarize_badge_roster(df_badging):
+    if df_badging.empty:
+        return pd.DataFrame(columns=['Site', 'Total Techs', 'YES', 'NO']), 0, 0
+    badge_counts = df_badging.groupby(['Site', 'Badge']).size().unstack(fill_value=0)
+    site_counts = badge_counts.reindex(columns=['YES', 'NO'], fill_value=0).reset_index()
+    site_counts.columns.name = None
+    site_counts.insert(1, 'Total Techs', site_counts['YES'] + site_counts['NO'])
+    unique_yes_count = df_badging[df_badging['Badge'] == 'YES']['Name'].nunique()
+    unique_no_count = df_badging[df_badging['Badge'] == 'NO']['Name'].nunique()
+    return site_counts, unique_yes_count, unique_no_count
+
+def badge_summary_from_rpc(site_rows, name_rows):
+    site_counts = pd.DataFrame(site_rows, columns=['Site', 'YES', 'NO'])
+    site_counts[['YES', 'NO']] = site_counts[['YES', 'NO']].astype('int64')
+    site_counts = site_counts.sort_values('Site', ignore_index=True)
+    site_counts.insert(1, 'Total Techs', site_counts['YES'] + site_counts['NO'])
+    return site_counts, int(name_rows[0]['badged']), int(name_rows[0]['pending'])
+
+# --- Badge summary ---
+LIVE_SITE_BADGED_PERCENT = 65
+
+@instrumented_cache_data(max_entries=8)
+def build_badge_summary(site_counts, unique_yes_count, unique_no_count):
+    # One vectorized pass feeds the summary table, the chart and the statistics block.
+    # st.cache_data hashes the per-site counts, so the result is reused until they change.
+    if site_counts.empty:
+        return None
+    site_summary = site_counts.copy()
+    total_techs = site_summary['Total Techs'].to_numpy(dtype='float64')
+    has_techs = total_techs > 0
+    total_text = site_summary['Total Techs'].astype('int64').astype(str)
+    for status, label in [('YES', 'Badged'), ('NO', 'Not Badged')]:
+        counts = site_summary[status].to_numpy(dtype='float64')
+        site_summary[f'{label} Fraction'] = np.where(
+            has_techs, site_summary[status].astype('int64').astype(str) + "/" + total_text, "0/0")
+        site_summary[f'{label} %'] = np.round(
+            np.divide(counts * 100, total_techs, out=np.zeros_like(counts), where=has_techs), 2)
+    site_summary_display = site_summary[['Site', 'Badged Fraction', 'Badged %']]
+    site_summary_display.columns = ['Site', 'Badged (Fraction)', 'Badged (%)']
+    chart_data = site_summary[['Site', 'YES', 'NO']].melt(id_vars=['Site'], var_name='Status', value_name='Count')
+    chart_data['Status'] = chart_data['Status'].map({'YES': 'Badged', 'NO': 'Not Badged'})
+    total_unique_names = unique_yes_count + unique_no_count
+    return {
+        "site_summary_display": site_summary_display,
+        "chart_data": chart_data,
+        "live_sites": site_summary.loc[site_summary['Badged %'] > LIVE_SITE_BADGED_PERCENT, 'Site'].tolist(),
+        "percent_badged": unique_yes_count / total_unique_names * 100 if total_unique_names > 0 else None}
+
+# --- P&L rollup ---
+KNOWN_SLAS = ['2 Hour', '4 Hour', '2 Day', '4 Day']
+PNL_MEASURES = ["Total FN Pay", "Total DXC Pay", "PNL"]
+
+def build_pnl_rollup(df_live_dispatches):
+    # Ticket counts and pay sums by month x SLA x Site, built once per data load so that
+    # switching months is a dictionary lookup instead of a pass over every ticket.
+    if df_live_dispatches.empty:
+        return None
+    month_key = (df_live_dispatches['Date'].dt.year * 100 + df_live_dispatches['Date'].dt.month).rename('Month')
+    cube = df_live_dispatches.groupby([month_key, 'SLA', 'Site'], dropna=False).agg(
+        Tickets=('SLA', 'size'), **{measure: (measure, 'sum') for measure in PNL_MEASURES})
+    site_tickets = cube['Tickets'].groupby(level='Site').sum().rename('count')
+    months = {}
+    for month, month_cube in sorted(cube.groupby(level='Month'), key=lambda item: item[0], reverse=True):
+        month_totals = month_cube.sum()
+        month_sites = month_cube['Tickets'].groupby(level='Site').sum().rename('count')
+        months[f"{month // 100:04d}-{month % 100:02d}"] = {
+            "Tickets": int(month_totals['Tickets']),
+            **{measure: float(month_totals[measure]) for measure in PNL_MEASURES},
+            "sla_counts": month_cube['Tickets'].groupby(level='SLA').sum().rename('count').sort_index(),
+            "site_counts": month_sites[month_sites.index.notna()].sort_index()}
+    return {
+        "total_tickets": len(df_live_dispatches),
+        "sla_counts": cube['Tickets'].groupby(level='SLA').sum().rename('count'),
+        "site_counts": site_tickets[site_tickets.index.notna()].sort_values(ascending=False),
+        "months": months}
+
+# --- Pricing engine ---
+PRICING_INPUT_COLUMNS = ["SLA", "Hours", "Additional"]
+PRICED_COLUMNS = ["Rounded Hours", "Base", "DXC Rate", "Total FN Pay", "Total DXC Pay", "PNL"]
+PRICING_CHECK_TOLERANCE = 0.005
+PRICING_VERIFY_ROWS = 500
+PRICING_MISMATCH_THRESHOLD = 0.02
+
+class PricingEngine:
+    """Vectorized model of the live_dispatches pricing triggers, so derived columns can be
+    shown before Supabase returns them. The trigger SQL is not in this repo, so the model
+    is only used while it reproduces the newest stored rows (see get_pricing_engine).
+    Configured by a [pricing] secrets section:
+
+        [pricing]
+        minimum_hours = 2.0
+        hours_increment = 1.0
+        [pricing.slas."2 Hour"]
+        base = 85.0
+        dxc_rate = 140.0
+
+    Hours are rounded up to the increment and never below the minimum; Base pays for
+    the minimum block, DXC Rate is billed per rounded hour."""
+
+    def __init__(self, sla_rates, minimum_hours=2.0, hours_increment=1.0):
+        self.sla_rates = sla_rates
+        self.minimum_hours = minimum_hours
+        self.hours_increment = hours_increment
+
+    @classmethod
+    def from_secrets(cls):
+        config = st.secrets.get("pricing")
+        if not config or not config.get("slas"):
+            return None
+        sla_rates = {sla: {"base": float(rates["base"]), "dxc_rate": float(rates["dxc_rate"])} for sla, rates in config["slas"].items()}
+        return cls(sla_rates, float(config.get("minimum_hours", 2.0)), float(config.get("hours_increment", 1.0)))
+
+    @classmethod
+    def from_rules_frame(cls, rules, minimum_hours, hours_increment):
+        return cls({row["SLA"]: {"base": float(row["Base"]), "dxc_rate": float(row["DXC Rate"])} for row in rules.fillna(0.0).to_dict("records")},
+                   minimum_hours, hours_increment)
+
+    def rules_frame(self):
+        return pd.DataFrame(
+            [{"SLA": sla, "Base": rates["base"], "DXC Rate": rates["dxc_rate"]} for sla, rates in self.sla_rates.items()],
+            columns=["SLA", "Base", "DXC Rate"])
+
+    def price(self, df):
+        sla = df["SLA"].astype(str)
+        hours = pd.to_numeric(df["Hours"], errors="coerce").fillna(0.0).to_numpy(dtype="float64")
+        additional = pd.to_numeric(df["Additional"], errors="coerce").fillna(0.0).to_numpy(dtype="float64") if "Additional" in df.columns else 0.0
+        # The small offset keeps float noise such as 2.0000001 from rounding up a whole increment.
+        rounded_hours = np.maximum(np.ceil(hours / self.hours_increment - 1e-9) * self.hours_increment, self.minimum_hours)
+        base = sla.map({name: rates["base"] for name, rates in self.sla_rates.items()}).fillna(0.0).to_numpy(dtype="float64")
+        dxc_rate = sla.map({name: rates["dxc_rate"] for name, rates in self.sla_rates.items()}).fillna(0.0).to_numpy(dtype="float64")
+        total_fn_pay = np.round(base * rounded_hours / self.minimum_hours + additional, 2)
+        total_dxc_pay = np.round(dxc_rate * rounded_hours, 2)
+        return df.assign(**{
+            "Rounded Hours": rounded_hours, "Base": base, "DXC Rate": dxc_rate,
+            "Total FN Pay": total_fn_pay, "Total DXC Pay": total_dxc_pay, "PNL": np.round(total_dxc_pay - total_fn_pay, 2)})
+
+    def mismatched_ids(self, df):
+        priced = self.price(df)
+        matches = np.ones(len(df), dtype=bool)
+        for col in PRICED_COLUMNS:
+            backend_values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64")
+            matches &= np.isclose(priced[col].to_numpy(dtype="float64"), backend_values, rtol=0.0, atol=PRICING_CHECK_TOLERANCE)
+        return df.loc[~matches, "id"].astype(int).tolist()
+
+@instrumented_cache_data(tables=["live_dispatches"], max_entries=2)
+def load_recent_priced_rows():
+    # The newest rows carry the current rates; older ones may have been priced under earlier rates.
+    columns = ["id"] + PRICING_INPUT_COLUMNS + PRICED_COLUMNS
+    response = supabase.table("live_dispatches").select(",".join(quote_column(col) for col in columns)).order(
+        "id", desc=True).limit(PRICING_VERIFY_ROWS).execute()
+    return pd.DataFrame(response.data or [], columns=columns)
+
+def check_pricing_engine():
+    # (configured engine, ids it misprices, rows checked) over the newest live_dispatches rows.
+    try:
+        pricing_engine = PricingEngine.from_secrets()
+        if pricing_engine is None:
+            return None, [], 0
+        df_recent = load_recent_priced_rows()
+    except Exception:
+        return None, [], 0
+    return pricing_engine, pricing_engine.mismatched_ids(df_recent), len(df_recent)
+
+def pricing_confirmed(checked_rows, mismatched_ids):
+    return checked_rows > 0 and len(mismatched_ids) <= checked_rows * PRICING_MISMATCH_THRESHOLD
+
+def get_pricing_engine():
+    # Optimistic repricing and the what-if panel only use an engine that reproduces the
+    # derived columns of nearly all of the newest rows; otherwise only Supabase's values are shown.
+    pricing_engine, mismatched_ids, checked_rows = check_pricing_engine()
+    return pricing_engine if pricing_confirmed(checked_rows, mismatched_ids) else None
+
+def reprice_dirty_rows(df, dirty_rows, pricing_engine):
+    # Optimistic derived columns for rows whose pricing inputs were edited; the synced
+    # values from Supabase replace them once the edits are saved.
+    if pricing_engine is None or not dirty_rows:
+        return df
+    repriced_ids = [row_id for row_id, dirty_row in dirty_rows.items() if set(dirty_row["cells"]) & set(PRICING_INPUT_COLUMNS)]
+    mask = df["id"].isin(repriced_ids)
+    if not mask.any():
+        return df
+    df = df.copy()
+    df.loc[mask, PRICED_COLUMNS] = pricing_engine.price(df.loc[mask])[PRICED_COLUMNS].to_numpy()
+    return df
+
+class PricingCheck:
+    """Confirms the engine against the values the triggers actually wrote, on a background
+    thread after each save, and keeps the outcome of the latest check."""
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pricing-check")
+        self.lock = threading.Lock()
+        self.checked_rows = 0
+        self.mismatched_ids = []
+
+    def submit(self, pricing_engine, row_ids):
+        if pricing_engine is not None and row_ids:
+            self.executor.submit(contextvars.Context().run, self._run, pricing_engine, list(row_ids))
+
+    def _run(self, pricing_engine, row_ids):
+        columns = ",".join(quote_column(col) for col in ["id"] + PRICING_INPUT_COLUMNS + PRICED_COLUMNS)
+        try:
+            with diagnostic_span("pricing_check", "live_dispatches"):
+                pages = [
+                    fetch_table_page("live_dispatches", columns, 0, FETCH_PAGE_SIZE - 1, (("in_", "id", tuple(row_ids[start:start + FETCH_PAGE_SIZE])),))
+                    for start in range(0, len(row_ids), FETCH_PAGE_SIZE)]
+                df_saved = pd.concat(pages, ignore_index=True)
+                mismatched_ids = pricing_engine.mismatched_ids(df_saved) if not df_saved.empty else []
+        except Exception:
+            return
+        with self.lock:
+            self.checked_rows = len(df_saved)
+            self.mismatched_ids = mismatched_ids
+
+@st.cache_resource
+def get_pricing_check():
+    return PricingCheck()
+
+def show_pricing_check():
+    pricing_engine, recent_mismatched_ids, recent_rows = check_pricing_engine()
+    if pricing_engine is not None and not pricing_confirmed(recent_rows, recent_mismatched_ids):
+        st.info(
+            f"Local pricing is off: the [pricing] secrets disagree with Supabase on {len(recent_mismatched_ids)} of "
+            f"the newest {recent_rows} row(s), so derived columns show only once Supabase has computed them.")
+    pricing_check = get_pricing_check()
+    with pricing_check.lock:
+        checked_rows, mismatched_ids = pricing_check.checked_rows, pricing_check.mismatched_ids
+    if mismatched_ids:
+        st.warning(
+            f"Local pricing differed from Supabase on {len(mismatched_ids)} of the last {checked_rows} saved row(s) "
+            f"(ids {', '.join(map(str, mismatched_ids[:10]))}{', ...' if len(mismatched_ids) > 10 else ''}). "
+            "The table shows Supabase's values; check the [pricing] secrets against the triggers.")
+
+def render_pricing_what_if(selected_month, month_rollup, pricing_engine, key_prefix):
+    # Reprices one month of the shared live_dispatches snapshot under edited rules, with no
+    # round trips beyond the snapshot's version probe.
+    st.subheader(f"What-if Pricing for {selected_month}")
+    rules_column, minimum_column = st.columns([3, 1])
+    rules = rules_column.data_editor(pricing_engine.rules_frame(), hide_index=True, disabled=["SLA"], key=f"{key_prefix}_rules")
+    minimum_hours = minimum_column.number_input(
+        "Minimum hours:", value=pricing_engine.minimum_hours, min_value=pricing_engine.hours_increment,
+        step=pricing_engine.hours_increment, key=f"{key_prefix}_minimum_hours")
+    _, snapshot_df = load_live_dispatches_snapshot()
+    month_start = pd.Timestamp(f"{selected_month}-01")
+    month_rows = snapshot_df[(snapshot_df["Date"] >= month_start) & (snapshot_df["Date"] < month_start + pd.offsets.MonthBegin(1))]
+    what_if = PricingEngine.from_rules_frame(rules, minimum_hours, pricing_engine.hours_increment).price(month_rows)
+    for column, measure in zip(st.columns(len(PNL_MEASURES)), PNL_MEASURES):
+        projected = float(what_if[measure].sum())
+        column.metric(f"What-if {measure}", f"${projected:,.2f}", delta=f"{projected - month_rollup[measure]:,.2f}")
+
+# --- Chart rendering cache ---
+def autopct_format(pct, allvals):
+    absolute_value = (pct / 100.) * sum(allvals)
+    return f"{pct:.1f}%\n(${absolute_value:,.2f})"
+
+@instrumented_cache_data(max_entries=32)
+def render_budget_pie(filtered_sizes, filtered_labels):
+    # Rendered to PNG bytes once per distinct input. The Figure is built without pyplot,
+    # so no global figure registry holds on to it after the bytes are written.
+    from matplotlib.figure import Figure
+    import seaborn as sns
+    fig1 = Figure(figsize=(8, 6))
+    ax1 = fig1.subplots()
+    ax1.pie(filtered_sizes, labels=filtered_labels, autopct=lambda pct: autopct_format(pct, filtered_sizes), startangle=90,
+            colors=sns.color_palette("pastel"))
+    ax1.axis('equal')
+    ax1.set_title("Budget Allocation")
+    png_buffer = io.BytesIO()
+    fig1.savefig(png_buffer, format="png", bbox_inches="tight", dpi=200)
+    fig1.clear()
+    return png_buffer.getvalue()
+
 st.set_page_config(
     page_title="Single-File Multi-Page App",
     page_icon="📄",
     layout="wide")
+# --- Report loaders ---
+# Backend errors propagate to the page rather than returning an empty frame: a cached empty
+# result would stand until the table's version changes, and would be kept as the last good copy.
+@instrumented_cache_data(tables=["badging_dispatches"], max_entries=2)
+def load_budget_data():
+    df_budget = fetch_table_paginated("badging_dispatches", columns=page_select("PAGE_3", "badging_dispatches"))
+    if not df_budget.empty:
+        if 'Total' in df_budget.columns:
+            df_budget['Total'] = pd.to_numeric(df_budget['Total'], errors='coerce').fillna(0.0)
+        else:
+            st.warning("Warning: 'Total' column not found in 'badging_dispatches' table for budget calculation.")
+            df_budget['Total'] = 0.0
+        return df_budget
+    return pd.DataFrame(columns=['Total'])
+
+@instrumented_cache_data(tables=["badging_dispatches"], serve_stale=True, max_entries=2)
+def load_paid_funds():
+    paid_total = call_aggregate_rpc(BUDGET_TOTAL_RPC)
+    if paid_total is not None:
+        return float(paid_total)
+    STARTUP_REPORT = load_budget_data()
+    if 'Total' in STARTUP_REPORT.columns:
+        return float(STARTUP_REPORT['Total'].sum())
+    st.warning("Cannot calculate 'Paid Funds' as 'Total' column is missing or not numeric in loaded data.")
+    return 0.0
+
+@instrumented_cache_data(tables=["names_and_sites"], max_entries=2)
+def load_badging_report_data():
+    response = supabase.table("names_and_sites").select(page_select("PAGE_3", "names_and_sites")).execute()
+    data = response.data
+    if data:
+        df_badging_temp = pd.DataFrame(data)
+        if 'Badge' in df_badging_temp.columns:
+            df_badging_temp['Badge'] = df_badging_temp['Badge'].astype(str).str.upper().str.strip()
+            df_badging_temp['Badge'] = df_badging_temp['Badge'].replace({'Y': 'YES', 'N': 'NO'})
+            df_badging_temp = df_badging_temp[df_badging_temp['Badge'].isin(['YES', 'NO'])]
+        else:
+            st.error("Error: 'BADGED' column not found in the 'names_and_sites' table. Cannot process badging data.")
+            return pd.DataFrame(columns=['Site', 'Badge', 'Name'])
+        if 'Site' not in df_badging_temp.columns:
+            st.error("Error: 'SITE' column not found in the 'names_and_sites' table. Cannot process badging data.")
+            return pd.DataFrame(columns=['Site', 'Badge', 'Name'])
+        if 'Name' not in df_badging_temp.columns:
+            st.error("Error: 'NAME' column not found in the 'names_and_sites' table. Cannot process badging data.")
+            return pd.DataFrame(columns=['Site', 'Badge', 'Name'])
+        return df_badging_temp.copy()
+    return pd.DataFrame(columns=['Site', 'Badge', 'Name'])
+
+@instrumented_cache_data(tables=["names_and_sites"], serve_stale=True, max_entries=2)
+def load_badge_summary():
+    site_rows = call_aggregate_rpc(BADGE_COUNTS_RPC)
+    name_rows = call_aggregate_rpc(BADGE_NAMES_RPC)
+    if site_rows is not None and name_rows:
+        return badge_summary_from_rpc(site_rows, name_rows)
+    return summarize_badge_roster(load_badging_report_data())
+
+def load_pnl_dispatches():
+    # Projected from the shared live_dispatches snapshot, which a restart restores from disk.
+    _, df_snapshot = load_live_dispatches_snapshot()
+    df_loaded = editor_dispatch_frame(df_snapshot[PAGE_QUERY_COLUMNS["PAGE_4"]["live_dispatches"]])
+    if not df_loaded.empty:
+        if "SLA" not in df_loaded.columns:
+            st.error("Error: 'SLA' column not found in 'live_dispatches' table. Please check your Supabase table schema.")
+            return pd.DataFrame()
+        df_loaded["SLA"] = df_loaded["SLA"].astype(str)
+        if "Date" in df_loaded.columns:
+            df_loaded["Date"] = pd.to_datetime(df_loaded["Date"], errors='coerce', format='%Y-%m-%d')
+            initial_rows = len(df_loaded)
+            df_loaded.dropna(subset=['Date'], inplace=True)
+            if len(df_loaded) < initial_rows:
+                st.warning(f"Removed {initial_rows - len(df_loaded)} rows due to invalid 'Date' values.")
+        else:
+            st.error("Error: 'Date' column not found in 'live_dispatches' table. Monthly analysis will not be available.")
+            return pd.DataFrame()
+        if not pd.api.types.is_datetime64_any_dtype(df_loaded['Date']):
+            st.error(f"Error: 'Date' column is not a datetime type after conversion. Current type: {df_loaded['Date'].dtype}. Check date format in Supabase.")
+            return pd.DataFrame() 
+        financial_cols = ["Total FN Pay", "Total DXC Pay", "PNL"]
+        for col in financial_cols:
+            if col in df_loaded.columns:
+                df_loaded[col] = pd.to_numeric(df_loaded[col], errors='coerce').fillna(0.0)
+            else:
+                st.warning(f"Warning: '{col}' column not found in 'live_dispatches' table. Financial calculations for this column will be zero.")
+                df_loaded[col] = 0.0
+        return df_loaded
+    else:
+        st.info("No data received from 'live_dispatches' table.")
+        return pd.DataFrame()
+
+@instrumented_cache_data(tables=["live_dispatches"], serve_stale=True, max_entries=2)
+def load_pnl_rollup():
+    return build_pnl_rollup(load_pnl_dispatches())
+
 def home_page():
     """Displays the home page content."""
     st.title("DXC-HPI Reporting Tool")
@@ -52,51 +1924,26 @@ def home_page():
 def PAGE_1():
     st.title("Badging Ticket Dispatches")
     st.write("View, filter, and add your badging tickets.")
-    EDITABLE_DISPLAY_COLUMNS = ["Date", "Tech", "Site", "Hours", "Additional", "Base", "Total"]
+    EDITABLE_DISPLAY_COLUMNS = BADGING_COLUMNS
     ALL_DISPLAY_COLUMNS = EDITABLE_DISPLAY_COLUMNS
-    @st.cache_data(ttl="1h")
+    badging_table = get_synced_table("badging_dispatches")
     def load_badging_data():
         try:
-            response = supabase.table("badging_dispatches").select("*").order("Date", desc=False).execute()
-            data = response.data
-            if data:
-                df_loaded = pd.DataFrame(data)
-                for col in ALL_DISPLAY_COLUMNS:
-                    if col not in df_loaded.columns:
-                        if col in ["Hours", "Additional", "Base", "Total"]:
-                            df_loaded[col] = 0.0
-                        elif col == "Date":
-                            df_loaded[col] = pd.NaT
-                        else:
-                            df_loaded[col] = ""
-                if "Date" in df_loaded.columns:
-                    df_loaded["Date"] = pd.to_datetime(df_loaded["Date"], errors='coerce')
-                for col in ["Hours", "Additional", "Base", "Total"]:
-                    if col in df_loaded.columns:
-                        df_loaded[col] = pd.to_numeric(df_loaded[col], errors='coerce').fillna(0.0)
-                for col in df_loaded.columns:
-                    if col not in ["id", "Date", "Hours", "Additional", "Base", "Total"]:
-                        df_loaded[col] = df_loaded[col].astype(str)
-                return df_loaded[ALL_DISPLAY_COLUMNS] 
-            else:
+            snapshot_version, df_loaded = badging_table.snapshot()
+            if df_loaded.empty:
                 st.info("No data found in 'badging_dispatches' table. Starting with an empty table.")
-                empty_df = pd.DataFrame(columns=ALL_DISPLAY_COLUMNS)
-                empty_df["id"] = pd.Series(dtype='int64') 
-                empty_df["Date"] = pd.to_datetime(pd.Series(dtype='datetime64[ns]'))
-                for col in ["Hours", "Additional", "Base", "Total"]:
-                    empty_df[col] = pd.Series(dtype='float64')
-                return empty_df
+            return snapshot_version, df_loaded
         except Exception as e:
             st.error(f"Error loading data from Supabase: {e}")
             st.warning("Displaying an empty DataFrame due to loading error.")
-            empty_df = pd.DataFrame(columns=ALL_DISPLAY_COLUMNS)
-            empty_df["id"] = pd.Series(dtype='int64')
-            empty_df["Date"] = pd.to_datetime(pd.Series(dtype='datetime64[ns]'))
-            for col in ["Hours", "Additional", "Base", "Total"]:
-                empty_df[col] = pd.Series(dtype='float64')
-            return empty_df
-    if 'df_badging_page1' not in st.session_state:
-        st.session_state.df_badging_page1 = load_badging_data()
+            return None, empty_dispatch_frame(ALL_DISPLAY_COLUMNS, BADGING_NUMERIC_COLUMNS)
+    def refresh_badging_data():
+        table_version.clear()
+        if badging_table.df is not None:
+            badging_table.sync()
+    def sync_badging_data(editor_key):
+        refresh_badging_data()
+        clear_editor_changes(editor_key, "dirty_badging_page1")
     st.header("Existing Badging Tickets")
     column_configuration = {
         "id": st.column_config.NumberColumn(
@@ -126,106 +1973,98 @@ def PAGE_1():
     for col in EDITABLE_DISPLAY_COLUMNS:
         if col not in column_configuration:
             column_configuration[col] = st.column_config.TextColumn(col)
-    edited_df = st.data_editor(
-        st.session_state.df_badging_page1,
-        num_rows="fixed",
-        use_container_width=True,
-        key="data_editor_badging_page1",
-        column_config=column_configuration,
-        column_order=ALL_DISPLAY_COLUMNS)
-    if not edited_df.equals(st.session_state.df_badging_page1):
-        st.session_state.df_badging_page1 = edited_df
-        st.warning("Data in the table has been modified. Click 'Save All Changes to Supabase' to persist.")
-    if st.button("Save All Changes to Supabase"):
-        try:
-            changes = st.session_state["data_editor_badging_page1"]["edited_rows"]
-            if changes:
-                for row_idx, updated_values in changes.items():
-                    row_id = st.session_state.df_badging_page1.loc[row_idx, 'id']
-                    data_to_update = {}
-                    for col, value in updated_values.items():
-                        if col == "Date":
-                            data_to_update[col] = value.strftime('%Y-%m-%d') if pd.notna(value) else None
-                        elif col in ["Hours", "Additional", "Base", "Total"]:
-                            data_to_update[col] = float(value)
-                        else:
-                            data_to_update[col] = str(value)
-                    response = supabase.table("badging_dispatches").update(data_to_update).eq("id", row_id).execute()
-                    if response.data:
-                        st.success(f"Row with ID {row_id} updated successfully!")
-                    else:
-                        st.error(f"Failed to update row {row_id}: {response.status_code} - {response.status_code}")
-            else:
-                st.info("No changes detected in the table to save.")
-            load_badging_data.clear()
-            if 'df_badging_page1' in st.session_state:
-                del st.session_state.df_badging_page1
-            st.rerun()
-        except Exception as e:
-            st.error(f"An error occurred while saving changes to Supabase: {e}")
-    st.markdown("---")
-    st.header("Add New Badging Ticket")
-    @st.cache_data(ttl="1h")
-    def load_tech_site_data():
-        try:
-            response = supabase.table("names_and_sites").select("Name, Site").execute()
-            data = response.data
-            if data:
-                df_names_sites = pd.DataFrame(data)
-                tech_names = sorted(df_names_sites['Name'].unique().tolist())
-                site_names = sorted(df_names_sites['Site'].unique().tolist())
-                return tech_names, site_names
-            return [], []
-        except Exception as e:
-            st.error(f"Error loading Tech and Site data: {e}")
-            return [], []
     tech_options, site_options = load_tech_site_data()
-    with st.form("new_badging_ticket_form", clear_on_submit=True):
-        col1, col2 = st.columns(2)
-        with col1:
-            new_date = st.date_input("Date:", value=datetime.today(), key="form_new_date")
-            selected_tech = st.selectbox("Tech:", options=[""] + tech_options, index=0, key="form_new_tech_select")
-            new_hours = st.number_input("Hours:", value=0.0, min_value=0.0, format="%.2f", key="form_new_hours")
-            new_base = st.number_input("Base ($):", value=0.0, min_value=0.0, format="%.2f", key="form_new_base")
-        with col2:
-            selected_site = st.selectbox("Site:", options=[""] + site_options, index=0, key="form_new_site_select")
-            new_additional = st.number_input("Additional ($):", value=0.0, min_value=0.0, format="%.2f", key="form_new_additional")
-            calculated_total = new_base + new_additional
-        add_button = st.form_submit_button("Add New Ticket")
-        if add_button:
-            new_row_data = {
-                "Date": new_date.strftime('%Y-%m-%d'),
-                "Tech": selected_tech,
-                "Site": selected_site,
-                "Hours": new_hours,
-                "Additional": new_additional,
-                "Base": new_base,
-                "Total": calculated_total}
+    # Each section below is a fragment: its widgets rerun only that section, against the
+    # handles this full run passed in, and a write reruns the whole page so every section sees it.
+    @traced_fragment
+    def badging_editor(tech_options, site_options):
+        show_save_summary("badging_save_summary")
+        if st.toggle("Paged view with server-side filters", key="paged_mode_page1"):
+            filters = dispatch_filter_clauses(render_dispatch_filters("page1", tech_options, site_options))
+            page_size, page_number = render_page_controls("page1")
+            shown_df, page_number = load_editor_window("badging_dispatches", "PAGE_1", filters, page_number, page_size)
+            base_df = shown_df
+            editor_key = window_editor_key("data_editor_badging_page1", filters, page_number, page_size, tuple(base_df["id"]))
+        else:
+            # The session keeps only its dirty set and the shown ids; the editor is keyed on the
+            # snapshot's version so positional edits never land on a newer one.
+            filter_spec = render_dispatch_filters("page1", tech_options, site_options, ticket_search=True)
+            snapshot_version, snapshot_df = load_badging_data()
+            shown_df = filter_snapshot("badging_dispatches", snapshot_version, snapshot_df, filter_spec)
+            base_df = editor_dispatch_frame(shown_df)
+            editor_key = window_editor_key(f"data_editor_badging_page1_v{snapshot_version}", filter_spec)
+        dirty_rows = carry_over_editor_changes(editor_key, base_df, "page1", BADGING_NUMERIC_COLUMNS, "dirty_badging_page1")
+        editor_df = apply_dirty_overlay(base_df, dirty_rows, BADGING_NUMERIC_COLUMNS)
+        st.data_editor(
+            editor_df,
+            num_rows="fixed",
+            use_container_width=True,
+            key=editor_key,
+            column_config=column_configuration,
+            column_order=ALL_DISPLAY_COLUMNS)
+        dirty_rows = track_editor_changes(editor_key, base_df, BADGING_NUMERIC_COLUMNS, "dirty_badging_page1")
+        show_dirty_warning(dirty_rows)
+        if st.button("Save All Changes to Supabase"):
             try:
-                response = supabase.table("badging_dispatches").insert([new_row_data]).execute()
-                if response.data:
-                    st.success("New ticket added to Supabase successfully!")
-                    load_badging_data.clear()
-                    if 'df_badging_page1' in st.session_state:
-                        del st.session_state.df_badging_page1
-                    st.rerun()
+                if dirty_rows:
+                    update_groups = build_update_groups(dirty_rows, BADGING_NUMERIC_COLUMNS)
+                    st.session_state.badging_save_summary = bulk_update_rows("badging_dispatches", update_groups)
+                    refresh_badging_data()
+                    clear_saved_changes(editor_key, "dirty_badging_page1", *st.session_state.badging_save_summary)
                 else:
-                    st.error(f"Failed to add new ticket: {response.status_code} - {response.status_code}")
+                    st.info("No changes detected in the table to save.")
+                    sync_badging_data(editor_key)
+                st.rerun()
             except Exception as e:
-                st.error(f"An error occurred while adding new ticket: {e}")
+                st.error(f"An error occurred while saving changes to Supabase: {e}")
+    @traced_fragment
+    def new_badging_ticket(tech_options, site_options):
+        if st.button("Refresh Tech/Site Lists", key="refresh_reference_page1"):
+            get_reference_data().invalidate()
+            st.rerun()
+        with st.form("new_badging_ticket_form", clear_on_submit=True):
+            col1, col2 = st.columns(2)
+            with col1:
+                new_date = st.date_input("Date:", value=datetime.today(), key="form_new_date")
+                selected_tech = st.selectbox("Tech:", options=[""] + tech_options, index=0, key="form_new_tech_select")
+                new_hours = st.number_input("Hours:", value=0.0, min_value=0.0, format="%.2f", key="form_new_hours")
+                new_base = st.number_input("Base ($):", value=0.0, min_value=0.0, format="%.2f", key="form_new_base")
+            with col2:
+                selected_site = st.selectbox("Site:", options=[""] + site_options, index=0, key="form_new_site_select")
+                new_additional = st.number_input("Additional ($):", value=0.0, min_value=0.0, format="%.2f", key="form_new_additional")
+                calculated_total = new_base + new_additional
+            add_button = st.form_submit_button("Add New Ticket")
+            if add_button:
+                new_row_data = {
+                    "Date": new_date.strftime('%Y-%m-%d'),
+                    "Tech": selected_tech,
+                    "Site": selected_site,
+                    "Hours": new_hours,
+                    "Additional": new_additional,
+                    "Base": new_base,
+                    "Total": calculated_total}
+                try:
+                    response = supabase.table("badging_dispatches").insert([new_row_data]).execute()
+                    if response.data:
+                        st.success("New ticket added to Supabase successfully!")
+                        refresh_badging_data()
+                        st.rerun()
+                    else:
+                        st.error(f"Failed to add new ticket: {response.status_code} - {response.status_code}")
+                except Exception as e:
+                    st.error(f"An error occurred while adding new ticket: {e}")
+        with st.expander("Bulk Import Badging Tickets"):
+            render_bulk_import("badging_dispatches", "page1", on_imported=refresh_badging_data)
+    badging_editor(tech_options, site_options)
+    st.markdown("---")
+    st.header("Add New Badging Ticket")
+    new_badging_ticket(tech_options, site_options)
 
 
 
 def load_tech_site_data():
     try:
-        response = supabase.table("names_and_sites").select("Name, Site").execute()
-        data = response.data
-        if data:
-            df_names_sites = pd.DataFrame(data)
-            tech_names = sorted(df_names_sites['Name'].unique().tolist())
-            site_names = sorted(df_names_sites['Site'].unique().tolist())
-            return tech_names, site_names
-        return [], []
+        return get_reference_data().options()
     except Exception as e:
         st.error(f"Error loading Tech and Site data: {e}")
         return [], []
@@ -234,59 +2073,28 @@ def load_tech_site_data():
 def PAGE_2():
     st.title("Live Ticket Dispatches")
     st.write("View, filter, and add your live dispatches.")
-    EDITABLE_DISPLAY_COLUMNS = ["Date", "Tech", "SLA", "Site", "Hours"]
-    ALL_LIVE_DISPATCHES_COLUMNS = [
-        "Date", "Tech", "SLA", "Site", "Hours", 
-        "Rounded Hours", "Additional", "Base", "DXC Rate", "Total FN Pay", "Total DXC Pay", "PNL"]
-    @st.cache_data(ttl="1h")
+    ALL_LIVE_DISPATCHES_COLUMNS = LIVE_DISPATCHES_COLUMNS
+    live_dispatches_table = get_synced_table("live_dispatches")
     def load_live_dispatches_data():
         try:
-            response = supabase.table("live_dispatches").select("*").order("Date", desc=False).execute()
-            data = response.data
-            if data:
-                df_loaded = pd.DataFrame(data)
-                for col in ALL_LIVE_DISPATCHES_COLUMNS:
-                    if col not in df_loaded.columns:
-                        if col in ["Hours", "Rounded Hours", "Additional", "Base", "DXC Rate", "Total FN Pay", "Total DXC Pay", "PNL"]:
-                            df_loaded[col] = 0.0
-                        elif col == "Date":
-                            df_loaded[col] = pd.NaT
-                        else:
-                            df_loaded[col] = ""
-                if "Date" in df_loaded.columns:
-                    df_loaded["Date"] = pd.to_datetime(df_loaded["Date"], errors='coerce')
-                numeric_cols = ["Hours", "Rounded Hours", "Additional", "Base", "DXC Rate", "Total FN Pay", "Total DXC Pay", "PNL"]
-                for col in numeric_cols:
-                    if col in df_loaded.columns:
-                        df_loaded[col] = pd.to_numeric(df_loaded[col], errors='coerce').fillna(0.0)
-                if "SLA" in df_loaded.columns:
-                    df_loaded["SLA"] = df_loaded["SLA"].astype(str)
-                for col in df_loaded.columns:
-                    if col not in ["ID", "Date"] + numeric_cols + ["SLA"]:
-                        df_loaded[col] = df_loaded[col].astype(str)
-                return df_loaded[ALL_LIVE_DISPATCHES_COLUMNS]
-            else:
+            snapshot_version, df_loaded = live_dispatches_table.snapshot()
+            if df_loaded.empty:
                 st.info("No data found in 'live_dispatches' table. Starting with an empty table.")
-                empty_df = pd.DataFrame(columns=ALL_LIVE_DISPATCHES_COLUMNS)
-                empty_df["ID"] = pd.Series(dtype='int64')
-                empty_df["Date"] = pd.to_datetime(pd.Series(dtype='datetime64[ns]'))
-                for col in ["Hours", "Rounded Hours", "Additional", "Base", "DXC Rate", "Total FN Pay", "Total DXC Pay", "PNL"]:
-                    empty_df[col] = pd.Series(dtype='float64')
-                empty_df["SLA"] = pd.Series(dtype='object')
-                return empty_df
+            return snapshot_version, df_loaded
         except Exception as e:
             st.error(f"Error loading data from Supabase: {e}")
             st.warning("Displaying an empty DataFrame due to loading error.")
-            empty_df = pd.DataFrame(columns=ALL_LIVE_DISPATCHES_COLUMNS)
-            empty_df["id"] = pd.Series(dtype='int64')
-            empty_df["Date"] = pd.to_datetime(pd.Series(dtype='datetime64[ns]'))
-            for col in ["Hours", "Rounded Hours", "Additional", "Base", "DXC Rate", "Total FN Pay", "Total DXC Pay", "PNL"]:
-                empty_df[col] = pd.Series(dtype='float64')
-            empty_df["SLA"] = pd.Series(dtype='object')
-            return empty_df
-    if 'df_live_dispatches_page2' not in st.session_state:
-        st.session_state.df_live_dispatches_page2 = load_live_dispatches_data()
+            return None, empty_dispatch_frame(ALL_LIVE_DISPATCHES_COLUMNS, LIVE_DISPATCHES_NUMERIC_COLUMNS)
+    def refresh_live_dispatches_data():
+        table_version.clear()
+        if live_dispatches_table.df is not None:
+            live_dispatches_table.sync()
+    def sync_live_dispatches_data(editor_key):
+        refresh_live_dispatches_data()
+        clear_editor_changes(editor_key, "dirty_live_dispatches_page2")
     st.header("Existing Live Dispatches")
+    show_pricing_check()
+    pricing_engine = get_pricing_engine()
     column_configuration = {
         "ID": st.column_config.NumberColumn(
             "ID",
@@ -343,237 +2151,187 @@ def PAGE_2():
             "P&L ($)",
             format="dollar",
             disabled=True),}
-    edited_df = st.data_editor(
-        st.session_state.df_live_dispatches_page2,
-        num_rows="fixed",
-        use_container_width=True,
-        key="data_editor_live_dispatches_page2",
-        column_config=column_configuration,
-        column_order=ALL_LIVE_DISPATCHES_COLUMNS)
-    if not edited_df.equals(st.session_state.df_live_dispatches_page2):
-        st.session_state.df_live_dispatches_page2 = edited_df
-        st.warning("Data in the table has been modified. Click 'Save All Changes to Supabase' to persist.")
-    if st.button("Save All Changes to Supabase (Live Dispatches)"):
-        try:
-            changes = st.session_state["data_editor_live_dispatches_page2"]["edited_rows"]
-            if changes:
-                for row_idx, updated_values in changes.items():
-                    row_id = st.session_state.df_live_dispatches_page2.loc[row_idx, 'id']
-                    data_to_update = {}
-                    for col, value in updated_values.items():
-                        if col == "Date":
-                            data_to_update[col] = value.strftime('%Y-%m-%d') if pd.notna(value) else None
-                        elif col in ["Hours"]:
-                            data_to_update[col] = float(value)
-                        elif col in ["SLA", "Tech", "Site"]:
-                            data_to_update[col] = str(value)
-                    response = supabase.table("live_dispatches").update(data_to_update).eq("id", row_id).execute()
-                    if response.data:
-                        st.success(f"Row with ID {row_id} updated successfully in live_dispatches!")
-                    else:
-                        st.error(f"Failed to update row {row_id}: {response.status_code} - {response.status_code}")
-            else:
-                st.info("No changes detected in the table to save.")
-            load_live_dispatches_data.clear()
-            if 'df_live_dispatches_page2' in st.session_state:
-                del st.session_state.df_live_dispatches_page2
-            st.rerun()
-        except Exception as e:
-            st.error(f"An error occurred while saving changes to live_dispatches: {e}")
-    st.markdown("---")
-    st.header("Add New Live Dispatch Ticket")
     tech_options, site_options = load_tech_site_data()
-    with st.form("new_live_dispatch_form", clear_on_submit=True):
-        col1, col2 = st.columns(2)
-        with col1:
-            new_date = st.date_input("Date:", value=datetime.today(), key="live_form_new_date")
-            selected_tech = st.selectbox("Tech:", options=[""] + tech_options, index=0, key="live_form_new_tech_select")
-            sla_options = ["2 Hour", "4 Hour", "2 Day", "4 Day"]
-            new_sla = st.selectbox("Select SLA:", sla_options, key="live_form_new_sla")        
-        with col2:
-            selected_site = st.selectbox("Site:", options=[""] + site_options, index=0, key="live_form_new_site_select")
-            new_hours = st.number_input("Hours:", value=0.0, min_value=0.0, format="%.2f", key="live_form_new_hours")
-            new_additional = st.number_input("Additional ($):", value=0.0, min_value=0.0, format="%.2f", key="form_new_additional")
-        add_button = st.form_submit_button("Add New Live Ticket")
-        if add_button:
-            new_row_data = {
-                "Date": new_date.strftime('%Y-%m-%d'),
-                "Tech": selected_tech,
-                "Site": selected_site,
-                "SLA": new_sla,
-                "Hours": new_hours,
-                "Additional": new_additional}
+    @traced_fragment
+    def live_dispatches_editor(tech_options, site_options, pricing_engine):
+        show_save_summary("live_dispatches_save_summary")
+        if st.toggle("Paged view with server-side filters", key="paged_mode_page2"):
+            filters = dispatch_filter_clauses(render_dispatch_filters("page2", tech_options, site_options, KNOWN_SLAS))
+            page_size, page_number = render_page_controls("page2")
+            shown_df, page_number = load_editor_window("live_dispatches", "PAGE_2", filters, page_number, page_size)
+            base_df = shown_df
+            editor_key = window_editor_key("data_editor_live_dispatches_page2", filters, page_number, page_size, tuple(base_df["id"]))
+        else:
+            filter_spec = render_dispatch_filters("page2", tech_options, site_options, KNOWN_SLAS, ticket_search=True)
+            snapshot_version, snapshot_df = load_live_dispatches_data()
+            shown_df = filter_snapshot("live_dispatches", snapshot_version, snapshot_df, filter_spec)
+            base_df = editor_dispatch_frame(shown_df)
+            editor_key = window_editor_key(f"data_editor_live_dispatches_page2_v{snapshot_version}", filter_spec)
+        dirty_rows = carry_over_editor_changes(editor_key, base_df, "page2", LIVE_DISPATCHES_NUMERIC_COLUMNS, "dirty_live_dispatches_page2")
+        if pricing_engine is not None:
+            # Fold this rerun's edits in before drawing, so repriced columns show with the edit itself.
+            dirty_rows = track_editor_changes(editor_key, base_df, LIVE_DISPATCHES_NUMERIC_COLUMNS, "dirty_live_dispatches_page2")
+        editor_df = apply_dirty_overlay(base_df, dirty_rows, LIVE_DISPATCHES_NUMERIC_COLUMNS)
+        editor_df = reprice_dirty_rows(editor_df, dirty_rows, pricing_engine)
+        st.data_editor(
+            editor_df,
+            num_rows="fixed",
+            use_container_width=True,
+            key=editor_key,
+            column_config=column_configuration,
+            column_order=ALL_LIVE_DISPATCHES_COLUMNS)
+        dirty_rows = track_editor_changes(editor_key, base_df, LIVE_DISPATCHES_NUMERIC_COLUMNS, "dirty_live_dispatches_page2")
+        show_dirty_warning(dirty_rows)
+        if st.button("Save All Changes to Supabase (Live Dispatches)"):
             try:
-                response = supabase.table("live_dispatches").insert([new_row_data]).execute()
-                if response.data:
-                    st.success("New live ticket added to Supabase successfully! Triggers should populate other fields.")
-                    load_live_dispatches_data.clear()
-                    if 'df_live_dispatches_page2' in st.session_state:
-                        del st.session_state.df_live_dispatches_page2
-                    st.rerun()
+                if dirty_rows:
+                    update_groups = build_update_groups(dirty_rows, LIVE_DISPATCHES_NUMERIC_COLUMNS)
+                    st.session_state.live_dispatches_save_summary = bulk_update_rows("live_dispatches", update_groups)
+                    get_pricing_check().submit(pricing_engine, st.session_state.live_dispatches_save_summary[0])
+                    refresh_live_dispatches_data()
+                    clear_saved_changes(editor_key, "dirty_live_dispatches_page2", *st.session_state.live_dispatches_save_summary)
                 else:
-                    st.error(f"Failed to add new live ticket: {response.status_code} - {response.status_code}")
-                    st.json(response.data)
+                    st.info("No changes detected in the table to save.")
+                    sync_live_dispatches_data(editor_key)
+                st.rerun()
             except Exception as e:
-                st.error(f"An error occurred while adding new live ticket: {e}")
-    st.markdown("---")
-    st.header("Add Canceled Work Order")
-    priority_options = ["P4", "P3", "P2", "P1"]
-    cancellation_type_options = ["Outside 24 HRS", "24-8 HRS", "8-0 HRS"]
-    with st.form("new_cancel_wo_form", clear_on_submit=True):
-        col1_cancel, col2_cancel = st.columns(2)
-        with col1_cancel:
-            cancel_date = st.date_input("Date:", value=datetime.today(), key="cancel_form_date")
-            cancel_site = st.selectbox("Site:", options=[""] + site_options, index=0, key="cancel_form_site_select")
-            cancel_tech = st.selectbox("Tech:", options=[""] + tech_options, index=0, key="cancel_form_tech_select")
-            cancel_priority = st.selectbox("Priority:", options=[""] + priority_options, index=0, key="cancel_form_priority")
-        with col2_cancel:
-            cancel_type = st.selectbox("Cancellation Type:", options=[""] + cancellation_type_options, index=0, key="cancel_form_type")
-            cancel_dxc_cost = st.number_input("DXC Cost:", value=0.0, min_value=0.0, format="%.2f", key="cancel_form_dxc_cost")
-            cancel_fn_pay = st.number_input("FN Pay:", value=0.0, min_value=0.0, format="%.2f", key="cancel_form_fn_pay")
-            cancel_ticket_num = st.text_input("Ticket #:", key="cancel_form_ticket_num")
-        add_cancel_button = st.form_submit_button("Add New Canceled WO")
-        if add_cancel_button:
-            if not cancel_site or not cancel_tech or not cancel_priority or not cancel_type or not cancel_ticket_num:
-                st.error("Please fill in all required fields (Site, Tech, Priority, Cancellation Type, Ticket #).")
-            else:
-                new_cancel_wo_data = {
-                    "Date": cancel_date.strftime('%Y-%m-%d'),
-                    "Site": cancel_site,
-                    "Tech": cancel_tech,
-                    "Priority": cancel_priority,
-                    "Cancellation Type": cancel_type,
-                    "DXC Cost": cancel_dxc_cost,
-                    "FN Pay": cancel_fn_pay,
-                    "Ticket #": cancel_ticket_num}
+                st.error(f"An error occurred while saving changes to live_dispatches: {e}")
+    @traced_fragment
+    def new_live_dispatch(tech_options, site_options, pricing_engine):
+        if st.button("Refresh Tech/Site Lists", key="refresh_reference_page2"):
+            get_reference_data().invalidate()
+            st.rerun()
+        with st.form("new_live_dispatch_form", clear_on_submit=True):
+            col1, col2 = st.columns(2)
+            with col1:
+                new_date = st.date_input("Date:", value=datetime.today(), key="live_form_new_date")
+                selected_tech = st.selectbox("Tech:", options=[""] + tech_options, index=0, key="live_form_new_tech_select")
+                sla_options = ["2 Hour", "4 Hour", "2 Day", "4 Day"]
+                new_sla = st.selectbox("Select SLA:", sla_options, key="live_form_new_sla")        
+            with col2:
+                selected_site = st.selectbox("Site:", options=[""] + site_options, index=0, key="live_form_new_site_select")
+                new_hours = st.number_input("Hours:", value=0.0, min_value=0.0, format="%.2f", key="live_form_new_hours")
+                new_additional = st.number_input("Additional ($):", value=0.0, min_value=0.0, format="%.2f", key="form_new_additional")
+            add_button = st.form_submit_button("Add New Live Ticket")
+            if add_button:
+                new_row_data = {
+                    "Date": new_date.strftime('%Y-%m-%d'),
+                    "Tech": selected_tech,
+                    "Site": selected_site,
+                    "SLA": new_sla,
+                    "Hours": new_hours,
+                    "Additional": new_additional}
                 try:
-                    # Insert data into CANCEL WOS table
-                    response = supabase.table("CANCEL WOS").insert([new_cancel_wo_data]).execute()
+                    response = supabase.table("live_dispatches").insert([new_row_data]).execute()
                     if response.data:
-                        st.success("New canceled work order added to Supabase successfully!")
-                        st.rerun() # Rerun to clear the form
+                        st.success("New live ticket added to Supabase successfully! Triggers should populate other fields.")
+                        get_pricing_check().submit(pricing_engine, [row["id"] for row in response.data])
+                        refresh_live_dispatches_data()
+                        st.rerun()
                     else:
-                        st.error(f"Failed to add new canceled WO: {response.status_code} - {response.status_code}")
+                        st.error(f"Failed to add new live ticket: {response.status_code} - {response.status_code}")
                         st.json(response.data)
                 except Exception as e:
-                    st.error(f"An error occurred while adding new canceled WO: {e}")
+                    st.error(f"An error occurred while adding new live ticket: {e}")
+        with st.expander("Bulk Import Live Dispatches"):
+            render_bulk_import("live_dispatches", "page2", on_imported=refresh_live_dispatches_data)
+    @traced_fragment
+    def new_cancel_wo(tech_options, site_options):
+        priority_options = CANCEL_PRIORITY_OPTIONS
+        cancellation_type_options = CANCELLATION_TYPE_OPTIONS
+        with st.form("new_cancel_wo_form", clear_on_submit=True):
+            col1_cancel, col2_cancel = st.columns(2)
+            with col1_cancel:
+                cancel_date = st.date_input("Date:", value=datetime.today(), key="cancel_form_date")
+                cancel_site = st.selectbox("Site:", options=[""] + site_options, index=0, key="cancel_form_site_select")
+                cancel_tech = st.selectbox("Tech:", options=[""] + tech_options, index=0, key="cancel_form_tech_select")
+                cancel_priority = st.selectbox("Priority:", options=[""] + priority_options, index=0, key="cancel_form_priority")
+            with col2_cancel:
+                cancel_type = st.selectbox("Cancellation Type:", options=[""] + cancellation_type_options, index=0, key="cancel_form_type")
+                cancel_dxc_cost = st.number_input("DXC Cost:", value=0.0, min_value=0.0, format="%.2f", key="cancel_form_dxc_cost")
+                cancel_fn_pay = st.number_input("FN Pay:", value=0.0, min_value=0.0, format="%.2f", key="cancel_form_fn_pay")
+                cancel_ticket_num = st.text_input("Ticket #:", key="cancel_form_ticket_num")
+            add_cancel_button = st.form_submit_button("Add New Canceled WO")
+            if add_cancel_button:
+                if not cancel_site or not cancel_tech or not cancel_priority or not cancel_type or not cancel_ticket_num:
+                    st.error("Please fill in all required fields (Site, Tech, Priority, Cancellation Type, Ticket #).")
+                else:
+                    new_cancel_wo_data = {
+                        "Date": cancel_date.strftime('%Y-%m-%d'),
+                        "Site": cancel_site,
+                        "Tech": cancel_tech,
+                        "Priority": cancel_priority,
+                        "Cancellation Type": cancel_type,
+                        "DXC Cost": cancel_dxc_cost,
+                        "FN Pay": cancel_fn_pay,
+                        "Ticket #": cancel_ticket_num}
+                    try:
+                        # Insert data into CANCEL WOS table
+                        response = supabase.table("CANCEL WOS").insert([new_cancel_wo_data]).execute()
+                        if response.data:
+                            st.success("New canceled work order added to Supabase successfully!")
+                            st.rerun() # Rerun to clear the form
+                        else:
+                            st.error(f"Failed to add new canceled WO: {response.status_code} - {response.status_code}")
+                            st.json(response.data)
+                    except Exception as e:
+                        st.error(f"An error occurred while adding new canceled WO: {e}")
+        with st.expander("Bulk Import Canceled Work Orders"):
+            render_bulk_import("CANCEL WOS", "page2_cancel")
+    live_dispatches_editor(tech_options, site_options, pricing_engine)
+    st.markdown("---")
+    st.header("Add New Live Dispatch Ticket")
+    new_live_dispatch(tech_options, site_options, pricing_engine)
+    st.markdown("---")
+    st.header("Add Canceled Work Order")
+    new_cancel_wo(tech_options, site_options)
 
 def PAGE_3():
+    # Plotting libraries are only imported once a report page is opened.
+    import altair as alt
     st.title("Reporting on Startup Budget")
     st.write("Startup Fee - $35,000")
-    @st.cache_data(ttl="1h")
-    def load_budget_data():
-        try:
-            response = supabase.table("badging_dispatches").select("Total").execute()
-            data = response.data
-            if data:
-                df_budget = pd.DataFrame(data)
-                if 'Total' in df_budget.columns:
-                    df_budget['Total'] = pd.to_numeric(df_budget['Total'], errors='coerce').fillna(0.0)
-                else:
-                    st.warning("Warning: 'Total' column not found in 'badging_dispatches' table for budget calculation.")
-                    df_budget['Total'] = 0.0
-                return df_budget
-            return pd.DataFrame(columns=['Total'])
-        except Exception as e:
-            st.error(f"Error loading budget data from Supabase: {e}")
-            return pd.DataFrame(columns=['Total'])
-    STARTUP_REPORT = load_budget_data()
-    st.subheader("Budget Breakdown")
-    total_budget = 35000.00
-    if 'Total' in STARTUP_REPORT.columns:
-        paid_funds = STARTUP_REPORT['Total'].sum()
-    else:
-        st.warning("Cannot calculate 'Paid Funds' as 'Total' column is missing or not numeric in loaded data.")
-        paid_funds = 0.0
-    unallocated_funds = total_budget - paid_funds
-    if unallocated_funds < 0:
-        st.warning(f"Warning: Paid Funds (${paid_funds:,.2f}) exceed Total Budget (${total_budget:,.2f}). Unallocated funds will be shown as $0.00.")
-        unallocated_funds = 0.0
-    labels = ['Spent', 'Unallocated Funds']
-    sizes = [paid_funds, unallocated_funds]
-    def autopct_format(pct, allvals):
-        absolute_value = (pct / 100.) * sum(allvals)
-        return f"{pct:.1f}%\n(${absolute_value:,.2f})"
-    filtered_labels = [label for i, label in enumerate(labels) if sizes[i] > 0]
-    filtered_sizes = [size for size in sizes if size > 0]
-    if not filtered_sizes:
-        st.info("No funds to display in the pie chart yet. Total column might be empty or zero.")
-        if total_budget > 0:
-            filtered_labels = ['Unallocated Funds']
-            filtered_sizes = [total_budget]
-        else:
-            filtered_labels = ['No Budget Set']
-            filtered_sizes = [1]
-    fig1, ax1 = plt.subplots(figsize=(8, 6))
-    ax1.pie(filtered_sizes, labels=filtered_labels, autopct=lambda pct: autopct_format(pct, filtered_sizes), startangle=90,
-            colors=sns.color_palette("pastel"))
-    ax1.axis('equal')
-    ax1.set_title(f"Budget Allocation")
-    st.pyplot(fig1)
+    try:
+        paid_funds, (site_counts, unique_yes_count, unique_no_count) = load_concurrently(load_paid_funds, load_badge_summary)
+    except Exception as e:
+        st.error(f"Error loading report data from Supabase: {e}")
+        return
+    # The two report sections are fragments over the loaded figures, so a widget in one
+    # reruns only that section instead of the loads and the other charts.
+    @traced_fragment
+    def budget_chart(paid_funds):
+        st.subheader("Budget Breakdown")
+        total_budget = 35000.00
+        unallocated_funds = total_budget - paid_funds
+        if unallocated_funds < 0:
+            st.warning(f"Warning: Paid Funds (${paid_funds:,.2f}) exceed Total Budget (${total_budget:,.2f}). Unallocated funds will be shown as $0.00.")
+            unallocated_funds = 0.0
+        labels = ['Spent', 'Unallocated Funds']
+        sizes = [paid_funds, unallocated_funds]
+        filtered_labels = [label for i, label in enumerate(labels) if sizes[i] > 0]
+        filtered_sizes = [size for size in sizes if size > 0]
+        if not filtered_sizes:
+            st.info("No funds to display in the pie chart yet. Total column might be empty or zero.")
+            if total_budget > 0:
+                filtered_labels = ['Unallocated Funds']
+                filtered_sizes = [total_budget]
+            else:
+                filtered_labels = ['No Budget Set']
+                filtered_sizes = [1]
+        st.image(render_budget_pie(tuple(filtered_sizes), tuple(filtered_labels)), width="stretch")
+    budget_chart(paid_funds)
     st.markdown("---")
     st.title("Reporting on Badging Process")
     st.write("Broken Down by Site")
-    @st.cache_data(ttl="1h")
-    def load_badging_report_data():
-        try:
-            response = supabase.table("names_and_sites").select("Name, Site, Badge").execute()
-            data = response.data
-            if data:
-                df_badging_temp = pd.DataFrame(data)
-                if 'Badge' in df_badging_temp.columns:
-                    df_badging_temp['Badge'] = df_badging_temp['Badge'].astype(str).str.upper().str.strip()
-                    df_badging_temp['Badge'] = df_badging_temp['Badge'].replace({'Y': 'YES', 'N': 'NO'})
-                    df_badging_temp = df_badging_temp[df_badging_temp['Badge'].isin(['YES', 'NO'])]
-                else:
-                    st.error("Error: 'BADGED' column not found in the 'names_and_sites' table. Cannot process badging data.")
-                    return pd.DataFrame(columns=['Site', 'Badge', 'Name'])
-                if 'Site' not in df_badging_temp.columns:
-                    st.error("Error: 'SITE' column not found in the 'names_and_sites' table. Cannot process badging data.")
-                    return pd.DataFrame(columns=['Site', 'Badge', 'Name'])
-                if 'Name' not in df_badging_temp.columns:
-                    st.error("Error: 'NAME' column not found in the 'names_and_sites' table. Cannot process badging data.")
-                    return pd.DataFrame(columns=['Site', 'Badge', 'Name'])
-                return df_badging_temp.copy()
-            return pd.DataFrame(columns=['Site', 'Badge', 'Name'])
-        except Exception as e:
-            st.error(f"Error loading badging report data from Supabase: {e}")
-            return pd.DataFrame(columns=['Site', 'Badge', 'Name'])
-    df_badging = load_badging_report_data()
-    if not df_badging.empty and 'Site' in df_badging.columns and 'Badge' in df_badging.columns:
-        total_techs_per_site = df_badging.groupby('Site').size().reset_index(name='Total Techs')
-        badged_counts = df_badging.groupby(['Site', 'Badge']).size().unstack(fill_value=0).reset_index()
-        site_summary = pd.merge(total_techs_per_site, badged_counts, on='Site', how='left')
-        site_summary = site_summary.fillna(0)
-        if 'YES' not in site_summary.columns:
-            site_summary['YES'] = 0
-        if 'NO' not in site_summary.columns:
-            site_summary['NO'] = 0
-        site_summary['Badged Fraction'] = site_summary.apply(
-            lambda row: f"{int(row['YES'])}/{int(row['Total Techs'])}" if row['Total Techs'] > 0 else "0/0", axis=1)
-        site_summary['Badged %'] = site_summary.apply(
-            lambda row: round((row['YES'] / row['Total Techs'] * 100), 2) if row['Total Techs'] > 0 else 0.0, axis=1)
-        site_summary['Not Badged Fraction'] = site_summary.apply(
-            lambda row: f"{int(row['NO'])}/{int(row['Total Techs'])}" if row['Total Techs'] > 0 else "0/0", axis=1)
-        site_summary['Not Badged %'] = site_summary.apply(
-            lambda row: round((row['NO'] / row['Total Techs'] * 100), 2) if row['Total Techs'] > 0 else 0.0, axis=1)
-        site_summary_display = site_summary[['Site','Badged Fraction', 'Badged %']]
-        site_summary_display.columns = ['Site', 'Badged (Fraction)', 'Badged (%)']
+    badge_summary = build_badge_summary(site_counts, unique_yes_count, unique_no_count)
+    if badge_summary is not None:
         st.subheader("Badging Progress Summary by Site")
-        st.dataframe(site_summary_display, use_container_width=True)
+        st.dataframe(badge_summary["site_summary_display"], use_container_width=True)
     else:
         st.info("No badging data available to generate summary by site.")
     st.subheader("Badging Progress Chart")
-    if not df_badging.empty and 'Site' in df_badging.columns and 'Badge' in df_badging.columns:
-        if 'site_summary' not in locals():
-             total_techs_per_site = df_badging.groupby('Site').size().reset_index(name='Total Techs')
-             badged_counts = df_badging.groupby(['Site', 'Badge']).size().unstack(fill_value=0).reset_index()
-             site_summary = pd.merge(total_techs_per_site, badged_counts, on='Site', how='left')
-             site_summary = site_summary.fillna(0)
-             if 'YES' not in site_summary.columns: site_summary['YES'] = 0
-             if 'NO' not in site_summary.columns: site_summary['NO'] = 0
-        chart_data = site_summary[['Site', 'YES', 'NO']].melt(id_vars=['Site'], var_name='Status', value_name='Count')
-        chart_data['Status'] = chart_data['Status'].replace({'YES': 'Badged', 'NO': 'Not Badged'})
+    if badge_summary is not None:
+        chart_data = badge_summary["chart_data"]
         if not chart_data.empty:
             chart = alt.Chart(chart_data).mark_bar().encode(
                 x=alt.X('Site:N', title='Site'),
@@ -587,199 +2345,240 @@ def PAGE_3():
             st.info("Not enough data to generate the badging progress chart.")
     else:
         st.info("No badging data available to generate the badging progress chart.")
-    st.subheader("Badging Statistics")
-    if not df_badging.empty and 'Site' in df_badging.columns and 'Badge' in df_badging.columns:
-        if 'site_summary' not in locals():
-             total_techs_per_site = df_badging.groupby('Site').size().reset_index(name='Total Techs')
-             badged_counts = df_badging.groupby(['Site', 'Badge']).size().unstack(fill_value=0).reset_index()
-             site_summary = pd.merge(total_techs_per_site, badged_counts, on='Site', how='left')
-             site_summary = site_summary.fillna(0)
-             if 'YES' not in site_summary.columns: site_summary['YES'] = 0
-             if 'NO' not in site_summary.columns: site_summary['NO'] = 0
-        sites_over_65_percent_badged = site_summary[site_summary['Badged %'] > 65]
-        num_sites_over_65_percent = len(sites_over_65_percent_badged)
-        st.write(f"Number of sites with **over 65%** of technicians badged: **{num_sites_over_65_percent}**")
-        if num_sites_over_65_percent > 0:
-            site_names_list = sites_over_65_percent_badged['Site'].tolist()
-            sites_string = ", ".join(site_names_list)
-            st.write(f"Live Sites: **{sites_string}**")
-        else:
-            st.info("No sites currently have over 65% of their technicians badged.")
-        unique_yes_count = df_badging[df_badging['Badge'] == 'YES']['Name'].nunique()
-        unique_no_count = df_badging[df_badging['Badge'] == 'NO']['Name'].nunique()
-        st.write(f"Technicians Badged: **{unique_yes_count}**")
-        st.write(f"Pending Badge Completion/Pickup: **{unique_no_count}**")
-        total_unique_names = unique_yes_count + unique_no_count
-        if total_unique_names > 0:
-            percent_badged = (unique_yes_count / total_unique_names) * 100
-            st.write(f"Percent Badged: **{percent_badged:.1f}%**")
+    @traced_fragment
+    def badge_statistics(site_counts, badge_summary, unique_yes_count, unique_no_count):
+        st.subheader("Badging Statistics")
+        if badge_summary is not None:
+            live_sites = badge_summary["live_sites"]
+            st.write(f"Number of sites with **over {LIVE_SITE_BADGED_PERCENT}%** of technicians badged: **{len(live_sites)}**")
+            if live_sites:
+                st.write(f"Live Sites: **{', '.join(live_sites)}**")
+            else:
+                st.info(f"No sites currently have over {LIVE_SITE_BADGED_PERCENT}% of their technicians badged.")
+            st.write(f"Technicians Badged: **{unique_yes_count}**")
+            st.write(f"Pending Badge Completion/Pickup: **{unique_no_count}**")
+            if badge_summary["percent_badged"] is not None:
+                st.write(f"Percent Badged: **{badge_summary['percent_badged']:.1f}%**")
+            else:
+                st.info("No technicians found in the badging data to calculate percentages.")
         else:
-            st.info("No technicians found in the badging data to calculate percentages.")
-    else:
-        st.info("No badging data available to generate badging statistics.")
+            st.info("No badging data available to generate badging statistics.")
+        if badge_summary is not None:
+            st.subheader("Export")
+            export_format = st.selectbox("Format:", ["Excel", "CSV"], key="page3_export_format")
+            render_export_button("Download Badge Progress by Site",
+                                 lambda: write_export([("Badge Progress", [badge_progress_frame(site_counts, badge_summary)])], export_format),
+                                 "badge_progress", export_format, "page3_export_badges")
+    badge_statistics(site_counts, badge_summary, unique_yes_count, unique_no_count)
 
 
 def PAGE_4():
     st.title("P&L Report")
     st.header("Ticket Breakdown")
-    @st.cache_data(ttl=300)
-    def load_live_dispatches_data():
-        try:
-            response = supabase.table("live_dispatches").select("*").execute()
-            data = response.data
-            if data:
-                df_loaded = pd.DataFrame(data)
-                if "SLA" not in df_loaded.columns:
-                    st.error("Error: 'SLA' column not found in 'live_dispatches' table. Please check your Supabase table schema.")
-                    return pd.DataFrame()
-                df_loaded["SLA"] = df_loaded["SLA"].astype(str)
-                if "Date" in df_loaded.columns:
-                    df_loaded["Date"] = pd.to_datetime(df_loaded["Date"], errors='coerce', format='%Y-%m-%d')
-                    initial_rows = len(df_loaded)
-                    df_loaded.dropna(subset=['Date'], inplace=True)
-                    if len(df_loaded) < initial_rows:
-                        st.warning(f"Removed {initial_rows - len(df_loaded)} rows due to invalid 'Date' values.")
+    try:
+        pnl_rollup, (tech_options, site_options) = load_concurrently(load_pnl_rollup, load_tech_site_data)
+    except Exception as e:
+        st.error(f"Error loading live dispatches data: {e}")
+        pnl_rollup, tech_options, site_options = None, [], []
+    # Picking a month or trying pricing rules reruns only this panel, over the rollup loaded once per page run.
+    @traced_fragment
+    def monthly_financial_panel(pnl_rollup):
+        month_year_options = list(pnl_rollup["months"])
+        if month_year_options:
+            selected_month_year = st.selectbox(
+                "Select Month/Year for Report:",
+                options=month_year_options,
+                index=0)
+            month_rollup = pnl_rollup["months"][selected_month_year]
+            st.subheader(f"Financial Summary for {selected_month_year}")
+            total_fn_pay = month_rollup["Total FN Pay"]
+            total_dxc_pay = month_rollup["Total DXC Pay"]
+            total_pnl = month_rollup["PNL"]
+            num_tickets_month = month_rollup["Tickets"]
+            avg_fn_pay_per_ticket = total_fn_pay / num_tickets_month if num_tickets_month > 0 else 0
+            avg_dxc_pay_per_ticket = total_dxc_pay / num_tickets_month if num_tickets_month > 0 else 0
+            avg_pnl_per_ticket = total_pnl / num_tickets_month if num_tickets_month > 0 else 0
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Total Field Nation Pay", f"${total_fn_pay:,.2f}")
+            with col2:
+                st.metric("Total DXC Pay", f"${total_dxc_pay:,.2f}")
+            with col3:
+                st.metric("Total P&L", f"${total_pnl:,.2f}")
+            st.markdown("---") # Separator line
+            st.subheader(f"Average Pay Per Ticket for {selected_month_year}")
+            col4, col5, col6 = st.columns(3)
+            with col4:
+                st.metric("Avg FN Pay Per Ticket", f"${avg_fn_pay_per_ticket:,.2f}")
+            with col5:
+                st.metric("Avg DXC Pay Per Ticket", f"${avg_dxc_pay_per_ticket:,.2f}")
+            with col6:
+                st.metric("Avg P&L Per Ticket", f"${avg_pnl_per_ticket:,.2f}")
+            st.markdown("---") # Separator line
+            st.subheader(f"Ticket Breakdown for {selected_month_year}")
+            col_breakdown1, col_breakdown2 = st.columns(2)
+            with col_breakdown1:
+                st.write("#### By SLA Category")
+                sla_breakdown_month = month_rollup["sla_counts"]
+                if not sla_breakdown_month.empty:
+                    st.dataframe(sla_breakdown_month.reset_index().rename(columns={'index': 'SLA Category', 'SLA': 'Ticket Count'}), hide_index=True)
                 else:
-                    st.error("Error: 'Date' column not found in 'live_dispatches' table. Monthly analysis will not be available.")
-                    return pd.DataFrame()
-                if not pd.api.types.is_datetime64_any_dtype(df_loaded['Date']):
-                    st.error(f"Error: 'Date' column is not a datetime type after conversion. Current type: {df_loaded['Date'].dtype}. Check date format in Supabase.")
-                    return pd.DataFrame() 
-                financial_cols = ["Total FN Pay", "Total DXC Pay", "PNL"]
-                for col in financial_cols:
-                    if col in df_loaded.columns:
-                        df_loaded[col] = pd.to_numeric(df_loaded[col], errors='coerce').fillna(0.0)
-                    else:
-                        st.warning(f"Warning: '{col}' column not found in 'live_dispatches' table. Financial calculations for this column will be zero.")
-                        df_loaded[col] = 0.0
-                return df_loaded
-            else:
-                st.info("No data received from 'live_dispatches' table.")
-                return pd.DataFrame()
-        except Exception as e:
-            st.error(f"Error loading live dispatches data: {e}")
-            return pd.DataFrame()
-    df_live_dispatches = load_live_dispatches_data()
-    if not df_live_dispatches.empty:
-        total_rows = len(df_live_dispatches)
-        st.write(f"**Total Ticket Count:** {total_rows}")
+                    st.info("No SLA breakdown data for this month.")
+            with col_breakdown2:
+                st.write("#### By Site")
+                site_breakdown_month = month_rollup["site_counts"]
+                if not site_breakdown_month.empty:
+                    st.dataframe(site_breakdown_month.reset_index().rename(columns={'index': 'Site', 'Site': 'Ticket Count'}), hide_index=True)
+                else:
+                    st.info("No Site breakdown data for this month.")
+            pricing_engine = get_pricing_engine()
+            if pricing_engine is not None:
+                st.markdown("---")
+                render_pricing_what_if(selected_month_year, month_rollup, pricing_engine, "page4_what_if")
+        else:
+            st.info("No valid month/year data found for financial analysis.")
+    @traced_fragment
+    def dispatch_detail_section(tech_options, site_options):
+        export_filters = dispatch_filter_clauses(render_dispatch_filters("page4_export", tech_options, site_options, KNOWN_SLAS))
+        export_format = st.selectbox("Format:", list(EXPORT_FORMATS), key="page4_export_format")
+        render_export_button("Download Dispatch Detail", lambda: dispatch_detail_export(export_filters, export_format),
+                             "live_dispatches", export_format, "page4_export_detail")
+    if pnl_rollup is not None:
+        st.write(f"**Total Ticket Count:** {pnl_rollup['total_tickets']}")
         st.subheader("Total Ticket Breakdown By SLA and Site")
         col_total_breakdown1, col_total_breakdown2 = st.columns(2)
         with col_total_breakdown1:
             st.write("#### By SLA Category")
-            known_slas = ['2 Hour', '4 Hour', '2 Day', '4 Day']
-            sla_counts_series = df_live_dispatches['SLA'].value_counts()
-            display_sla_counts = {sla: sla_counts_series.get(sla, 0) for sla in known_slas}
-            other_sla_count = 0
-            for sla_val in df_live_dispatches['SLA'].unique():
-                if sla_val not in known_slas and pd.notna(sla_val) and sla_val.strip() != '':
-                    other_sla_count += sla_counts_series.get(sla_val, 0)
-            display_sla_counts['Other'] = other_sla_count
+            sla_counts_series = pnl_rollup["sla_counts"]
+            display_sla_counts = {sla: sla_counts_series.get(sla, 0) for sla in KNOWN_SLAS}
+            other_sla_counts = sla_counts_series[[sla not in KNOWN_SLAS and sla.strip() != '' for sla in sla_counts_series.index]]
+            display_sla_counts['Other'] = int(other_sla_counts.sum())
             st.write(f"**2 Hour SLA:** {display_sla_counts['2 Hour']}")
             st.write(f"**4 Hour SLA:** {display_sla_counts['4 Hour']}")
             st.write(f"**2 Day SLA:** {display_sla_counts['2 Day']}")
             st.write(f"**4 Day SLA:** {display_sla_counts['4 Day']}")
             if display_sla_counts['Other'] > 0:
                 st.write(f"**Other SLA Types:** {display_sla_counts['Other']}")
-                other_sla_df = df_live_dispatches[~df_live_dispatches['SLA'].isin(known_slas) & df_live_dispatches['SLA'].notna() & (df_live_dispatches['SLA'].astype(str).str.strip() != '')]
+                other_sla_df = pd.DataFrame({'SLA': other_sla_counts.index.repeat(other_sla_counts.to_numpy())})
                 st.dataframe(other_sla_df[['SLA']], hide_index=True)
         with col_total_breakdown2:
             st.write("#### By Site")
-            if "Site" in df_live_dispatches.columns:
-                # Get Site counts for the entire dataset, sorted by value (most tickets first)
-                site_breakdown_total = df_live_dispatches['Site'].value_counts().sort_values(ascending=False)
-                if not site_breakdown_total.empty:
-                    st.dataframe(site_breakdown_total.reset_index().rename(columns={'index': 'Site', 'Site': 'Site Code', 'count':'Ticket Volume'}), hide_index=True)
-                else:
-                    st.info("No Site breakdown data available.")
+            site_breakdown_total = pnl_rollup["site_counts"]
+            if not site_breakdown_total.empty:
+                st.dataframe(site_breakdown_total.reset_index().rename(columns={'index': 'Site', 'Site': 'Site Code', 'count':'Ticket Volume'}), hide_index=True)
             else:
-                st.info("Site column not available for breakdown.")
+                st.info("No Site breakdown data available.")
         st.markdown("---")
         # --- Monthly Financial Analysis Section ---
         st.markdown("---")
         st.header("Monthly Financial Analysis")
-        if "Date" in df_live_dispatches.columns and pd.api.types.is_datetime64_any_dtype(df_live_dispatches['Date']):
-            df_live_dispatches['MonthYear'] = df_live_dispatches['Date'].dt.strftime('%Y-%m')
-            month_year_options = sorted(df_live_dispatches['MonthYear'].unique(), reverse=True)
-            if month_year_options:
-                selected_month_year = st.selectbox(
-                    "Select Month/Year for Report:",
-                    options=month_year_options,
-                    index=0)
-                df_filtered_month = df_live_dispatches[df_live_dispatches['MonthYear'] == selected_month_year].copy()
-                if not df_filtered_month.empty:
-                    st.subheader(f"Financial Summary for {selected_month_year}")
-                    total_fn_pay = df_filtered_month["Total FN Pay"].sum()
-                    total_dxc_pay = df_filtered_month["Total DXC Pay"].sum()
-                    total_pnl = df_filtered_month["PNL"].sum()
-                    num_tickets_month = len(df_filtered_month)
-                    avg_fn_pay_per_ticket = total_fn_pay / num_tickets_month if num_tickets_month > 0 else 0
-                    avg_dxc_pay_per_ticket = total_dxc_pay / num_tickets_month if num_tickets_month > 0 else 0
-                    avg_pnl_per_ticket = total_pnl / num_tickets_month if num_tickets_month > 0 else 0
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.metric("Total Field Nation Pay", f"${total_fn_pay:,.2f}")
-                    with col2:
-                        st.metric("Total DXC Pay", f"${total_dxc_pay:,.2f}")
-                    with col3:
-                        st.metric("Total P&L", f"${total_pnl:,.2f}")
-                    st.markdown("---") # Separator line
-                    st.subheader(f"Average Pay Per Ticket for {selected_month_year}")
-                    col4, col5, col6 = st.columns(3)
-                    with col4:
-                        st.metric("Avg FN Pay Per Ticket", f"${avg_fn_pay_per_ticket:,.2f}")
-                    with col5:
-                        st.metric("Avg DXC Pay Per Ticket", f"${avg_dxc_pay_per_ticket:,.2f}")
-                    with col6:
-                        st.metric("Avg P&L Per Ticket", f"${avg_pnl_per_ticket:,.2f}")
-                    st.markdown("---") # Separator line
-                    st.subheader(f"Ticket Breakdown for {selected_month_year}")
-                    col_breakdown1, col_breakdown2 = st.columns(2)
-                    with col_breakdown1:
-                        st.write("#### By SLA Category")
-                        # Get SLA counts for the filtered month
-                        sla_breakdown_month = df_filtered_month['SLA'].value_counts().sort_index()
-                        if not sla_breakdown_month.empty:
-                            st.dataframe(sla_breakdown_month.reset_index().rename(columns={'index': 'SLA Category', 'SLA': 'Ticket Count'}), hide_index=True)
-                        else:
-                            st.info("No SLA breakdown data for this month.")
-                    with col_breakdown2:
-                        st.write("#### By Site")
-                        # Get Site counts for the filtered month
-                        # Ensure 'Site' column is present and valid before counting
-                        if "Site" in df_filtered_month.columns:
-                            site_breakdown_month = df_filtered_month['Site'].value_counts().sort_index()
-                            if not site_breakdown_month.empty:
-                                st.dataframe(site_breakdown_month.reset_index().rename(columns={'index': 'Site', 'Site': 'Ticket Count'}), hide_index=True)
-                            else:
-                                st.info("No Site breakdown data for this month.")
-                        else:
-                            st.info("Site column not available for breakdown.")
-                else:
-                    st.info(f"No data available for {selected_month_year}.")
-            else:
-                st.info("No valid month/year data found for financial analysis.")
-        else:
-            st.info("Date column is missing or not correctly formatted as datetime, unable to perform monthly financial analysis.")
+        monthly_financial_panel(pnl_rollup)
     else:
         st.info("No data found in 'live_dispatches' table or an error occurred during loading.")
+    st.markdown("---")
+    st.header("Export")
+    if pnl_rollup is not None:
+        render_export_button("Download P&L Summary (Excel)", lambda: write_export(pnl_summary_sheets(pnl_rollup), "Excel"),
+                             "pnl_summary", "Excel", "page4_export_summary")
+    st.write("#### Dispatch Detail")
+    dispatch_detail_section(tech_options, site_options)
+
+
 
 
 
+# --- Prefetch scheduler ---
+PREFETCH_MAX_WORKERS = 4
+
+def load_badging_snapshot():
+    return get_synced_table("badging_dispatches").snapshot()
+
+def load_live_dispatches_snapshot():
+    return get_synced_table("live_dispatches").snapshot()
+
+PAGE_LOADERS = {
+    "Badging Tickets": [load_badging_snapshot, load_tech_site_data],
+    "Live Dispatches": [load_live_dispatches_snapshot, load_tech_site_data],
+    "Reporting Page": [load_paid_funds, load_badge_summary],
+    "P&L Report": [load_pnl_rollup, load_tech_site_data]}
+LIKELY_NEXT_PAGES = {
+    "Home": ["Badging Tickets", "Live Dispatches", "Reporting Page", "P&L Report"],
+    "Badging Tickets": ["Live Dispatches", "Reporting Page"],
+    "Live Dispatches": ["P&L Report", "Badging Tickets"],
+    "Reporting Page": ["P&L Report", "Badging Tickets"],
+    "P&L Report": ["Live Dispatches", "Reporting Page"]}
+
+def load_concurrently(*loaders):
+    # Runs a page's independent loaders side by side, so the page waits for the slowest
+    # query rather than the sum of them. Workers draw on the page and share its trace.
+    ctx = get_script_run_ctx()
+    def run(loader):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return loader()
+    with ThreadPoolExecutor(max_workers=len(loaders)) as executor:
+        futures = [submit_with_context(executor, run, loader) for loader in loaders]
+        return [future.result() for future in futures]
+
+class PrefetchScheduler:
+    """Warms the shared caches behind the pages a user is likely to open next, on a
+    small background pool, so switching pages finds the data already loaded. Each
+    loader has at most one warm-up in flight."""
+
+    def __init__(self, max_workers=PREFETCH_MAX_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    def warm(self, page_names):
+        for page_name in page_names:
+            for loader in PAGE_LOADERS.get(page_name, []):
+                self.submit(loader.__name__, loader)
+
+    def submit(self, name, loader, *args, **kwargs):
+        with self.lock:
+            # Functions are redefined on every rerun, so in-flight work is tracked by name.
+            if name in self.pending:
+                return
+            self.pending.add(name)
+        self.executor.submit(contextvars.Context().run, self._run, name, loader, args, kwargs)
+
+    def _run(self, name, loader, args, kwargs):
+        try:
+            with diagnostic_span("prefetch", name):
+                loader(*args, **kwargs)
+        except Exception:
+            # The page reports the error when it loads the data itself.
+            pass
+        finally:
+            with self.lock:
+                self.pending.discard(name)
 
+@st.cache_resource
+def get_prefetch_scheduler():
+    return PrefetchScheduler()
 
 # --- Main Application Logic ---
 st.sidebar.title("Navigation")
 page_selection = st.sidebar.radio(
     "Go to",
     ("Home", "Badging Tickets", "Live Dispatches", "Reporting Page", "P&L Report"))
-if page_selection == "Home":
-    home_page()
-elif page_selection == "Badging Tickets":
-    PAGE_1()
-elif page_selection == "Live Dispatches":
-    PAGE_2()
-elif page_selection == "Reporting Page":
-    PAGE_3()
-elif page_selection == "P&L Report":
-    PAGE_4()
+show_diagnostics = st.sidebar.toggle("Show diagnostics", key="show_diagnostics")
+stale_notice = st.empty()
+with trace_page(page_selection, measure_bytes=show_diagnostics) as page_trace:
+    if page_selection == "Home":
+        home_page()
+    elif page_selection == "Badging Tickets":
+        PAGE_1()
+    elif page_selection == "Live Dispatches":
+        PAGE_2()
+    elif page_selection == "Reporting Page":
+        PAGE_3()
+    elif page_selection == "P&L Report":
+        PAGE_4()
+show_stale_notice(stale_notice, page_trace)
+# Warm the next pages once the current one is drawn, on arrival rather than on every widget rerun.
+if st.session_state.get("prefetched_after") != page_selection:
+    st.session_state.prefetched_after = page_selection
+    get_prefetch_scheduler().warm(LIKELY_NEXT_PAGES[page_selection])
+if show_diagnostics:
+    render_diagnostics_panel()
@@ -0,0 +1,303 @@
+import sys
+import threading
+import time
+import types
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_data import price_live_dispatches
+
+# PostgREST's default db-max-rows; larger ranges are silently truncated, as in production.
+MAX_ROWS = 1000
+
+
+class APIError(Exception):
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+class APIResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _split_select(select_list):
+    columns, current, quoted = [], "", False
+    for ch in select_list:
+        if ch == '"':
+            quoted = not quoted
+        elif ch == "," and not quoted:
+            columns.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    if current.strip():
+        columns.append(current.strip())
+    return None if columns == ["*"] else columns
+
+
+def _records(df):
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+class FakeQuery:
+    def __init__(self, client, table_name):
+        self.client = client
+        self.table_name = table_name
+        self.operation = "select"
+        self.columns = None
+        self.count = None
+        self.head = False
+        self.filters = []
+        self.orders = []
+        self.row_range = None
+        self.payload = None
+
+    def select(self, *columns, count=None, head=False):
+        self.columns = _split_select(",".join(columns))
+        self.count = count
+        self.head = head
+        return self
+
+    def insert(self, rows, **kwargs):
+        self.operation, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict="id", **kwargs):
+        self.operation, self.payload = "upsert", rows
+        return self
+
+    def update(self, values, **kwargs):
+        self.operation, self.payload = "update", values
+        return self
+
+    def delete(self, **kwargs):
+        self.operation = "delete"
+        return self
+
+    def _filter(self, operator, column, value):
+        self.filters.append((operator, column, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter("eq", column, value)
+
+    def neq(self, column, value):
+        return self._filter("neq", column, value)
+
+    def gt(self, column, value):
+        return self._filter("gt", column, value)
+
+    def gte(self, column, value):
+        return self._filter("gte", column, value)
+
+    def lt(self, column, value):
+        return self._filter("lt", column, value)
+
+    def lte(self, column, value):
+        return self._filter("lte", column, value)
+
+    def in_(self, column, values):
+        return self._filter("in", column, list(values))
+
+    def order(self, column, desc=False, nullsfirst=None):
+        self.orders.append((column, desc))
+        return self
+
+    def range(self, start, end):
+        self.row_range = (start, end)
+        return self
+
+    def limit(self, size):
+        self.row_range = (0, size - 1)
+        return self
+
+    def _mask(self, df):
+        mask = np.ones(len(df), dtype=bool)
+        for operator, column, value in self.filters:
+            if column not in df.columns:
+                raise APIError(f"column {self.table_name}.{column} does not exist", code="42703")
+            values = df[column]
+            if operator == "eq":
+                mask &= (values == value).to_numpy()
+            elif operator == "neq":
+                mask &= (values != value).to_numpy()
+            elif operator == "gt":
+                mask &= (values > value).to_numpy()
+            elif operator == "gte":
+                mask &= (values >= value).to_numpy()
+            elif operator == "lt":
+                mask &= (values < value).to_numpy()
+            elif operator == "lte":
+                mask &= (values <= value).to_numpy()
+            elif operator == "in":
+                mask &= values.isin(value).to_numpy()
+        return mask
+
+    def execute(self):
+        self.client.wait()
+        with self.client.lock:
+            return self.client.record(self.table_name, self.operation, self._execute())
+
+    def _execute(self):
+        tables = self.client.tables
+        if self.table_name not in tables:
+            raise APIError(f'relation "public.{self.table_name}" does not exist', code="42P01")
+        df = tables[self.table_name]
+        if self.operation in ("insert", "upsert"):
+            rows = self.payload if isinstance(self.payload, list) else [self.payload]
+            tables[self.table_name], written = self.client.write_rows(self.table_name, df, rows, self.operation == "upsert")
+            return APIResponse(written)
+        for column in (self.columns or []) + [column for column, desc in self.orders]:
+            if column not in df.columns:
+                raise APIError(f"column {self.table_name}.{column} does not exist", code="42703")
+        mask = self._mask(df)
+        if self.operation == "update":
+            df = df.copy()
+            for column, value in self.payload.items():
+                df.loc[mask, column] = value
+            tables[self.table_name] = df = self.client.touch_rows(self.table_name, df, mask)
+            return APIResponse(_records(df[mask]))
+        if self.operation == "delete":
+            tables[self.table_name] = df[~mask].reset_index(drop=True)
+            return APIResponse(_records(df[mask]))
+        selected = df if mask.all() else df[mask]
+        total = len(selected)
+        if self.head:
+            return APIResponse([], total if self.count else None)
+        # Tables are kept sorted by id, so the common id-ordered scan needs no sort.
+        if self.orders and self.orders != [("id", False)]:
+            by = [column for column, desc in self.orders]
+            selected = selected.sort_values(by, ascending=[not desc for column, desc in self.orders], kind="stable")
+        start, end = self.row_range if self.row_range else (0, total - 1)
+        selected = selected.iloc[start:min(end + 1, start + MAX_ROWS)]
+        if self.columns:
+            selected = selected[self.columns]
+        return APIResponse(_records(selected), total if self.count else None)
+
+
+class FakeRPC:
+    def __init__(self, client, function_name, params):
+        self.client = client
+        self.function_name = function_name
+        self.params = params or {}
+
+    def execute(self):
+        self.client.wait()
+        with self.client.lock:
+            function = self.client.rpc_functions.get(self.function_name) if self.client.rpc_enabled else None
+            if function is None:
+                raise APIError(f"Could not find the function public.{self.function_name} without parameters", code="PGRST202")
+            return self.client.record("rpc", self.function_name, APIResponse(function(self.client.tables, **self.params)))
+
+
+def _badge_roster(tables):
+    df = tables["names_and_sites"]
+    badge = df["Badge"].astype(str).str.upper().str.strip().replace({"Y": "YES", "N": "NO"})
+    df = df.assign(badge=badge)
+    return df[badge.isin(["YES", "NO"])]
+
+
+def _badge_counts_by_site(tables):
+    roster = _badge_roster(tables)
+    roster = roster[roster["Site"].notna()]
+    counts = roster.groupby(["Site", "badge"]).size().unstack(fill_value=0).reindex(columns=["YES", "NO"], fill_value=0)
+    return [{"Site": site, "YES": int(row["YES"]), "NO": int(row["NO"])} for site, row in counts.iterrows()]
+
+
+def _badge_distinct_names(tables):
+    roster = _badge_roster(tables)
+    return [{"badged": int(roster.loc[roster["badge"] == "YES", "Name"].nunique()),
+             "pending": int(roster.loc[roster["badge"] == "NO", "Name"].nunique())}]
+
+
+class FakeClient:
+    """In-memory stand-in for the supabase-py client, holding one DataFrame per table.
+    Implements the query-builder surface app.py uses, the RPCs from sql/report_aggregates.sql
+    and sql/bulk_update_rows.sql, and the live_dispatches pricing triggers."""
+
+    def __init__(self, tables, rpc_enabled=True, latency=0.0):
+        self.tables = {name: df.sort_values("id", ignore_index=True) if "id" in df.columns else df
+                       for name, df in tables.items()}
+        self.rpc_enabled = rpc_enabled
+        self.latency = latency
+        self.rpc_functions = {
+            "badging_budget_total": lambda tables: float(pd.to_numeric(tables["badging_dispatches"]["Total"]).sum()),
+            "badge_counts_by_site": _badge_counts_by_site,
+            "badge_distinct_names": _badge_distinct_names,
+            "bulk_update_rows": self.bulk_update_rows}
+        self.lock = threading.RLock()
+        self.calls = []
+
+    def table(self, table_name):
+        return FakeQuery(self, table_name)
+
+    def from_(self, table_name):
+        return self.table(table_name)
+
+    def rpc(self, function_name, params=None):
+        return FakeRPC(self, function_name, params)
+
+    def now(self):
+        return datetime.now(timezone.utc).isoformat()
+
+    def wait(self):
+        # Simulated round trip, outside the lock so concurrent requests overlap as they would over HTTP.
+        if self.latency:
+            time.sleep(self.latency)
+
+    def record(self, target, operation, response):
+        rows = response.data if isinstance(response.data, list) else []
+        self.calls.append({"target": target, "operation": operation, "rows": len(rows)})
+        return response
+
+    def touch_rows(self, table_name, df, mask):
+        # The updated_at and pricing triggers, for rows updated in place.
+        df.loc[mask, "updated_at"] = self.now()
+        if table_name == "live_dispatches" and mask.any():
+            df.loc[mask] = price_live_dispatches(df[mask])
+        return df
+
+    def bulk_update_rows(self, tables, target_table, changed_columns, changes):
+        df = tables[target_table].copy()
+        changes = pd.DataFrame(changes, columns=["id", *changed_columns]).set_index("id")
+        mask = df["id"].isin(changes.index).to_numpy()
+        for column in changed_columns:
+            df.loc[mask, column] = df.loc[mask, "id"].map(changes[column])
+        tables[target_table] = df = self.touch_rows(target_table, df, mask)
+        return [{"id": int(row_id)} for row_id in df.loc[mask, "id"]]
+
+    def write_rows(self, table_name, df, rows, upsert):
+        written = pd.DataFrame(rows)
+        written["updated_at"] = self.now()
+        if "id" not in written.columns:
+            written["id"] = np.nan
+        existing = written["id"].isin(df["id"]) if upsert else pd.Series(False, index=written.index)
+        # Upserted rows keep the stored values of any column the payload leaves out.
+        updated_rows = df[df["id"].isin(written.loc[existing, "id"])].set_index("id")
+        updated_rows.update(written[existing].set_index("id"))
+        new_rows = written[~existing].copy()
+        next_id = int(df["id"].max()) + 1 if len(df) else 1
+        missing_ids = new_rows["id"].isna()
+        new_rows.loc[missing_ids, "id"] = np.arange(next_id, next_id + missing_ids.sum())
+        changed = pd.concat([updated_rows.reset_index(), new_rows], ignore_index=True)
+        changed["id"] = changed["id"].astype("int64")
+        if table_name == "live_dispatches" and "SLA" in changed.columns:
+            changed = price_live_dispatches(changed)
+        changed = changed.reindex(columns=df.columns.union(changed.columns, sort=False))
+        df = pd.concat([df[~df["id"].isin(changed["id"])], changed], ignore_index=True).sort_values("id", ignore_index=True)
+        return df, _records(changed)
+
+
+def install(client):
+    """Makes `from supabase import create_client` in app.py return the given fake client."""
+    module = types.ModuleType("supabase")
+    module.Client = FakeClient
+    module.create_client = lambda url, key: client
+    sys.modules["supabase"] = module
+    return client
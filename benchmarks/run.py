@@ -0,0 +1,190 @@
+"""Benchmarks app.py against an in-memory Supabase stand-in.
+
+    python -m benchmarks.run --rows 1000 100000 --json results.json
+    python -m benchmarks.run --rows 1000 100000 --baseline results.json
+
+Loader timings call app.py's functions directly; page timings render each sidebar
+page cold (caches cleared) and warm through Streamlit's AppTest. With --baseline
+the run exits non-zero when any timing is slower than the baseline by more than
+--tolerance.
+"""
+import argparse
+import ast
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_ROOT, "app.py")
+sys.path.insert(0, REPO_ROOT)
+# No on-disk snapshots: cold timings are real loads, and synthetic tables are never left where
+# `streamlit run app.py` in this checkout would restore them. The restore benchmark uses its own
+# temporary store.
+os.environ["DISPATCH_SNAPSHOT_DIR"] = ""
+
+from benchmarks.fake_supabase import FakeClient, install
+from benchmarks.synthetic_data import MINIMUM_BILLED_HOURS, SLA_BASE_PAY, SLA_DXC_RATE, generate_tables
+
+PAGES = ["Badging Tickets", "Live Dispatches", "Reporting Page", "P&L Report"]
+
+
+def calls_streamlit(node):
+    for child in ast.walk(node):
+        if isinstance(child, ast.Call):
+            root = child.func
+            while isinstance(root, ast.Attribute):
+                root = root.value
+            if isinstance(root, ast.Name) and root.id == "st":
+                return True
+    return False
+
+
+def load_app_definitions(client):
+    """Executes app.py's imports, constants, functions and classes without rendering
+    anything, so the loaders can be timed outside a Streamlit run."""
+    tree = ast.parse(open(APP_PATH).read())
+    definitions = [
+        node for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef))
+        or (isinstance(node, ast.Assign) and not calls_streamlit(node.value))]
+    namespace = {"__name__": "app_definitions"}
+    exec(compile(ast.Module(body=definitions, type_ignores=[]), APP_PATH, "exec"), namespace)
+    namespace["supabase"] = namespace["InstrumentedClient"](client) if "InstrumentedClient" in namespace else client
+    return namespace
+
+
+def clear_streamlit_caches():
+    import streamlit as st
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+def timed(function, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def benchmark_loaders(client, repeat):
+    app = load_app_definitions(client)
+    results = {}
+    for page_name, projections in app["PAGE_QUERY_COLUMNS"].items():
+        for table_name in projections:
+            columns = app["page_select"](page_name, table_name)
+            results[f"fetch {page_name} {table_name}"] = timed(
+                lambda: app["fetch_table_paginated"](table_name, columns=columns), repeat)
+    for table_name in app["SYNCED_TABLE_SPECS"]:
+        page_name = app["SYNCED_TABLE_SPECS"][table_name][0]
+        synced_table = app["SyncedTable"](
+            table_name, app["page_select"](page_name, table_name), *app["SYNCED_TABLE_SPECS"][table_name][1:], order_by="Date")
+        results[f"synced load {table_name}"] = timed(synced_table.load, repeat, setup=lambda: setattr(synced_table, "df", None))
+        results[f"synced sync {table_name}"] = timed(synced_table.sync, repeat)
+        snapshot_df = synced_table.load()
+        results[f"editor frame {table_name}"] = timed(lambda: app["editor_dispatch_frame"](snapshot_df), repeat)
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            # A restart: a fresh process restores the snapshot its predecessor left on disk.
+            store = app["SnapshotStore"](snapshot_dir)
+            store.save(table_name, synced_table.columns, snapshot_df, synced_table.watermark)
+            store.executor.submit(lambda: None).result()
+            results[f"synced restore {table_name}"] = timed(lambda: app["SyncedTable"](
+                table_name, synced_table.columns, *app["SYNCED_TABLE_SPECS"][table_name][1:], order_by="Date", store=store).load(), repeat)
+            store.executor.submit(lambda: None).result()
+        results[f"window {table_name}"] = timed(
+            lambda: app["load_dispatch_window"].__wrapped__(table_name, app["page_select"](page_name, table_name), (), 1, 100), repeat)
+    reference_data = app["ReferenceData"]()
+    results["reference options"] = timed(reference_data.options, repeat, setup=reference_data.invalidate)
+    df_live = app["fetch_table_paginated"]("live_dispatches", columns=app["page_select"]("PAGE_4", "live_dispatches"))
+    df_live["Date"] = app["pd"].to_datetime(df_live["Date"], errors="coerce")
+    results["pnl rollup"] = timed(lambda: app["build_pnl_rollup"](df_live), repeat)
+    return results
+
+
+def new_app_test():
+    from streamlit.testing.v1 import AppTest
+    app_test = AppTest.from_file(APP_PATH, default_timeout=600)
+    app_test.secrets["SUPABASE_URL"] = "http://benchmark.invalid"
+    app_test.secrets["SUPABASE_KEY"] = "benchmark"
+    # The same rates the fake's pricing triggers use, so the client-side pricing engine is exercised.
+    app_test.secrets["pricing"] = {
+        "minimum_hours": MINIMUM_BILLED_HOURS,
+        "slas": {sla: {"base": SLA_BASE_PAY[sla], "dxc_rate": SLA_DXC_RATE[sla]} for sla in SLA_BASE_PAY}}
+    return app_test
+
+
+def benchmark_pages(repeat):
+    results = {}
+    samples = {}
+    for _ in range(repeat):
+        clear_streamlit_caches()
+        app_test = new_app_test()
+        start = time.perf_counter()
+        app_test.run()
+        samples.setdefault("render home cold", []).append((time.perf_counter() - start) * 1000)
+        for page in PAGES:
+            clear_streamlit_caches()
+            for phase in ("cold", "warm"):
+                start = time.perf_counter()
+                app_test.sidebar.radio[0].set_value(page).run()
+                samples.setdefault(f"render {page} {phase}", []).append((time.perf_counter() - start) * 1000)
+                if app_test.exception:
+                    raise RuntimeError(f"{page}: {app_test.exception[0].value}")
+    for name, values in samples.items():
+        results[name] = statistics.median(values)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for size, timings in results.items():
+        for name, value in timings.items():
+            previous = baseline.get(size, {}).get(name)
+            if previous and value > previous * (1 + tolerance) and value - previous > 5:
+                regressions.append(f"{size} rows, {name}: {previous:.1f} ms -> {value:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time app.py loaders and page renders against an in-memory Supabase.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000], help="live_dispatches sizes to run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every backend call")
+    parser.add_argument("--no-rpc", action="store_true", help="run without the report RPCs deployed")
+    parser.add_argument("--skip-pages", action="store_true")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown over the baseline")
+    args = parser.parse_args()
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    os.chdir(REPO_ROOT)
+    results = {}
+    for rows in args.rows:
+        client = install(FakeClient(generate_tables(rows), rpc_enabled=not args.no_rpc, latency=args.latency))
+        timings = benchmark_loaders(client, args.repeat)
+        if not args.skip_pages:
+            timings.update(benchmark_pages(args.repeat))
+        results[str(rows)] = timings
+        print(f"\n{rows} live_dispatches rows ({len(client.calls)} backend calls)")
+        for name, value in timings.items():
+            print(f"  {name:<48} {value:10.1f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
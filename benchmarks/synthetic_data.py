@@ -0,0 +1,123 @@
+import argparse
+import os
+from datetime import date, timezone
+
+import numpy as np
+import pandas as pd
+
+SLAS = ["2 Hour", "4 Hour", "2 Day", "4 Day"]
+SLA_WEIGHTS = [0.15, 0.35, 0.3, 0.2]
+PRIORITIES = ["P4", "P3", "P2", "P1"]
+CANCELLATION_TYPES = ["Outside 24 HRS", "24-8 HRS", "8-0 HRS"]
+BADGE_VALUES = ["YES", "NO", "Y", "N", "yes", "no", None]
+BADGE_WEIGHTS = [0.35, 0.25, 0.1, 0.1, 0.08, 0.07, 0.05]
+
+# Stand-in for the live_dispatches pricing triggers, so generated and inserted rows carry
+# plausible derived columns. These are synthetic rates, not the production ones.
+SLA_BASE_PAY = {"2 Hour": 85.0, "4 Hour": 75.0, "2 Day": 65.0, "4 Day": 60.0}
+SLA_DXC_RATE = {"2 Hour": 140.0, "4 Hour": 120.0, "2 Day": 100.0, "4 Day": 95.0}
+MINIMUM_BILLED_HOURS = 2.0
+
+
+def price_live_dispatches(df):
+    sla = df["SLA"].astype(str)
+    hours = pd.to_numeric(df["Hours"], errors="coerce").fillna(0.0)
+    additional = pd.to_numeric(df["Additional"], errors="coerce").fillna(0.0) if "Additional" in df.columns else 0.0
+    priced = df.copy()
+    priced["Rounded Hours"] = np.maximum(np.ceil(hours), MINIMUM_BILLED_HOURS)
+    priced["Additional"] = additional
+    priced["Base"] = sla.map(SLA_BASE_PAY).fillna(0.0)
+    priced["DXC Rate"] = sla.map(SLA_DXC_RATE).fillna(0.0)
+    priced["Total FN Pay"] = (priced["Base"] * priced["Rounded Hours"] / MINIMUM_BILLED_HOURS + additional).round(2)
+    priced["Total DXC Pay"] = (priced["DXC Rate"] * priced["Rounded Hours"]).round(2)
+    priced["PNL"] = (priced["Total DXC Pay"] - priced["Total FN Pay"]).round(2)
+    return priced
+
+
+def _dates(rng, n, start, days):
+    return (np.datetime64(start) + rng.integers(0, days, n).astype("timedelta64[D]")).astype(str)
+
+
+def _updated_at(rng, n, start, days):
+    seconds = rng.integers(0, days * 86400, n).astype("timedelta64[s]")
+    stamps = pd.to_datetime(np.datetime64(start) + seconds).tz_localize(timezone.utc)
+    return stamps.strftime("%Y-%m-%dT%H:%M:%S+00:00")
+
+
+def generate_tables(n_live=10_000, n_badging=None, n_names=None, n_cancel=None, n_sites=None, seed=0,
+                    start=date(2023, 1, 1), days=730):
+    """Returns {table name: DataFrame} shaped like the Supabase tables the app reads."""
+    rng = np.random.default_rng(seed)
+    n_badging = n_live // 10 if n_badging is None else n_badging
+    n_names = max(20, min(5_000, n_live // 50)) if n_names is None else n_names
+    n_cancel = n_live // 20 if n_cancel is None else n_cancel
+    n_sites = max(5, n_names // 25) if n_sites is None else n_sites
+    sites = np.array([f"SITE{i:03d}" for i in range(n_sites)])
+    techs = np.array([f"Tech {i:05d}" for i in range(n_names)])
+    tech_sites = sites[rng.integers(0, n_sites, n_names)]
+
+    names_and_sites = pd.DataFrame({
+        "id": np.arange(1, n_names + 1),
+        "Name": techs,
+        "Site": tech_sites,
+        "Badge": rng.choice(np.array(BADGE_VALUES, dtype=object), n_names, p=BADGE_WEIGHTS),
+        "updated_at": _updated_at(rng, n_names, start, days)})
+
+    def dispatch_rows(n):
+        tech_index = rng.integers(0, n_names, n)
+        return {
+            "id": np.arange(1, n + 1),
+            "Date": _dates(rng, n, start, days),
+            "Tech": techs[tech_index],
+            "Site": tech_sites[tech_index],
+            "Hours": np.round(rng.gamma(2.0, 1.2, n), 2),
+            "updated_at": _updated_at(rng, n, start, days)}
+
+    badging = pd.DataFrame(dispatch_rows(n_badging))
+    badging["Base"] = rng.choice([50.0, 65.0, 75.0], n_badging)
+    badging["Additional"] = np.round(rng.choice([0.0, 0.0, 0.0, 15.0, 25.0], n_badging), 2)
+    badging["Total"] = badging["Base"] + badging["Additional"]
+    badging = badging[["id", "Date", "Tech", "Site", "Hours", "Additional", "Base", "Total", "updated_at"]]
+
+    live = pd.DataFrame(dispatch_rows(n_live))
+    live["SLA"] = rng.choice(SLAS, n_live, p=SLA_WEIGHTS)
+    live["Additional"] = np.round(rng.choice([0.0, 0.0, 0.0, 0.0, 20.0, 40.0], n_live), 2)
+    live = price_live_dispatches(live)[[
+        "id", "Date", "Tech", "SLA", "Site", "Hours", "Rounded Hours", "Additional", "Base", "DXC Rate",
+        "Total FN Pay", "Total DXC Pay", "PNL", "updated_at"]]
+
+    cancel_tech_index = rng.integers(0, n_names, n_cancel)
+    cancel_wos = pd.DataFrame({
+        "id": np.arange(1, n_cancel + 1),
+        "Date": _dates(rng, n_cancel, start, days),
+        "Site": tech_sites[cancel_tech_index],
+        "Tech": techs[cancel_tech_index],
+        "Priority": rng.choice(PRIORITIES, n_cancel),
+        "Cancellation Type": rng.choice(CANCELLATION_TYPES, n_cancel),
+        "DXC Cost": np.round(rng.choice([0.0, 50.0, 95.0], n_cancel), 2),
+        "FN Pay": np.round(rng.choice([0.0, 25.0, 45.0], n_cancel), 2),
+        "Ticket #": [f"WO{n:08d}" for n in rng.integers(0, 10 ** 8, n_cancel)],
+        "updated_at": _updated_at(rng, n_cancel, start, days)})
+
+    return {
+        "names_and_sites": names_and_sites,
+        "badging_dispatches": badging.sort_values("id", ignore_index=True),
+        "live_dispatches": live.sort_values("id", ignore_index=True),
+        "CANCEL WOS": cancel_wos}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic dispatch tables as CSV files.")
+    parser.add_argument("--rows", type=int, default=10_000, help="live_dispatches rows; other tables scale from it")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="synthetic_data")
+    args = parser.parse_args()
+    os.makedirs(args.out, exist_ok=True)
+    for table_name, df in generate_tables(args.rows, seed=args.seed).items():
+        path = os.path.join(args.out, f"{table_name.replace(' ', '_')}.csv")
+        df.to_csv(path, index=False)
+        print(f"{table_name}: {len(df)} rows -> {path}")
+
+
+if __name__ == "__main__":
+    main()
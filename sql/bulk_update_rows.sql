@@ -0,0 +1,23 @@
+-- Bulk update used by "Save All Changes to Supabase" on the Badging Tickets and
+-- Live Dispatches pages. Run in the Supabase SQL editor. The app falls back to
+-- one update per row when this function is not deployed.
+--
+-- Every row in `changes` sets the same `changed_columns`, keyed by "id"; only
+-- those columns are written, so cells another dispatcher saved in the meantime
+-- are left alone. It is a plain UPDATE: rows deleted since they were loaded are
+-- not inserted again, and only update triggers fire. Returns the ids it updated.
+-- security invoker keeps the caller's row level security policies in force.
+
+create or replace function bulk_update_rows(target_table text, changed_columns text[], changes jsonb)
+returns table (id bigint)
+language plpgsql
+security invoker
+as $$
+begin
+    return query execute format(
+        'update %1$I as t set %2$s from jsonb_populate_recordset(null::%1$I, $1) as c where t.id = c.id returning t.id::bigint',
+        target_table,
+        (select string_agg(format('%1$I = c.%1$I', col), ', ') from unnest(changed_columns) as col))
+    using changes;
+end;
+$$;
@@ -0,0 +1,46 @@
+-- Aggregate functions used by the Reporting Page (PAGE_3).
+-- Run in the Supabase SQL editor. The app falls back to computing the same
+-- numbers in pandas when these functions are not deployed.
+
+create or replace function badging_budget_total()
+returns numeric
+language sql stable
+as $$
+    select coalesce(sum("Total"), 0) from badging_dispatches;
+$$;
+
+-- Badge values are normalized the same way as load_badging_report_data:
+-- trimmed, upper-cased, Y/N expanded to YES/NO, anything else dropped.
+create or replace view names_and_sites_badges as
+    select "Name", "Site", badge
+    from (
+        select "Name", "Site",
+            case upper(trim("Badge"::text))
+                when 'Y' then 'YES'
+                when 'N' then 'NO'
+                else upper(trim("Badge"::text))
+            end as badge
+        from names_and_sites
+    ) normalized
+    where badge in ('YES', 'NO');
+
+create or replace function badge_counts_by_site()
+returns table ("Site" text, "YES" bigint, "NO" bigint)
+language sql stable
+as $$
+    select "Site"::text,
+        count(*) filter (where badge = 'YES'),
+        count(*) filter (where badge = 'NO')
+    from names_and_sites_badges
+    where "Site" is not null
+    group by "Site";
+$$;
+
+create or replace function badge_distinct_names()
+returns table (badged bigint, pending bigint)
+language sql stable
+as $$
+    select count(distinct "Name") filter (where badge = 'YES'),
+        count(distinct "Name") filter (where badge = 'NO')
+    from names_and_sites_badges;
+$$;
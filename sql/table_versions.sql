@@ -0,0 +1,43 @@
+-- Change tracking used by the app's table version probe and delta sync.
+-- Run in the Supabase SQL editor. Without an updated_at column the probe falls
+-- back to the row count and highest id, which misses in-place edits.
+--
+-- Rows are stamped with clock_timestamp(), the time of the write, not now(), the
+-- start of its transaction. Even so, a row can commit a little after another row
+-- stamped later. The app's delta sync therefore re-reads SYNC_LOOKBACK_SECONDS
+-- behind its watermark, and keeps syncing until that margin has passed.
+
+create or replace function set_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at = clock_timestamp();
+    return new;
+end;
+$$;
+
+alter table badging_dispatches add column if not exists updated_at timestamptz not null default now();
+alter table live_dispatches add column if not exists updated_at timestamptz not null default now();
+alter table names_and_sites add column if not exists updated_at timestamptz not null default now();
+alter table "CANCEL WOS" add column if not exists updated_at timestamptz not null default now();
+
+create or replace trigger badging_dispatches_set_updated_at
+    before insert or update on badging_dispatches
+    for each row execute function set_updated_at();
+create or replace trigger live_dispatches_set_updated_at
+    before insert or update on live_dispatches
+    for each row execute function set_updated_at();
+create or replace trigger names_and_sites_set_updated_at
+    before insert or update on names_and_sites
+    for each row execute function set_updated_at();
+create or replace trigger cancel_wos_set_updated_at
+    before insert or update on "CANCEL WOS"
+    for each row execute function set_updated_at();
+
+-- The probe reads the newest updated_at and the delta sync scans from the
+-- watermark; both are index range scans with these in place.
+create index if not exists badging_dispatches_updated_at_idx on badging_dispatches (updated_at);
+create index if not exists live_dispatches_updated_at_idx on live_dispatches (updated_at);
+create index if not exists names_and_sites_updated_at_idx on names_and_sites (updated_at);
+create index if not exists cancel_wos_updated_at_idx on "CANCEL WOS" (updated_at);